@@ -0,0 +1,97 @@
+import logging
+import os
+import shutil
+import tempfile
+
+from ResultCache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactStore:
+    """
+    Content-addressed store of files produced by pipeline stages, shared by all jobs.
+    Every entry is a directory <root>/<stage>/<key> holding copies of the files a
+    stage produced for the inputs hashed into key (see ResultCache.cache_key).
+    Entries are published with an atomic rename, so a half-written entry is never
+    visible, and the least recently used ones are pruned once max_bytes is exceeded.
+    """
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or os.path.join(CACHE_DIR, "artifacts")
+        if max_bytes is None:
+            max_bytes = int(os.getenv("ARTIFACT_CACHE_MAX_MB", 2048)) * 1024 * 1024
+        self.max_bytes = max_bytes
+
+    def entry(self, stage, key):
+        return os.path.join(self.root, stage, key)
+
+    def fetch(self, stage, key, directory):
+        """Copy a cached entry into directory. Returns the copied paths, or None on a miss"""
+        entry = self.entry(stage, key)
+        try:
+            # The entry's mtime doubles as its last-used time for pruning; touched first
+            # so a prune running alongside this copy sees the entry as recently used
+            os.utime(entry)
+            names = sorted(os.listdir(entry))
+        except FileNotFoundError:
+            return None
+        paths = []
+        try:
+            for name in names:
+                destination = os.path.join(directory, name)
+                shutil.copyfile(os.path.join(entry, name), destination)
+                paths.append(destination)
+        except FileNotFoundError:
+            # Pruned by another job or process mid-copy: a miss, without partial copies left behind
+            for path in paths:
+                os.remove(path)
+            logger.debug(f"Artifact {stage} {key[:12]} was pruned while being fetched")
+            return None
+        logger.debug(f"Artifact cache hit for {stage} {key[:12]}: {len(paths)} files")
+        return paths
+
+    def store(self, stage, key, paths):
+        """Publish copies of paths as the entry for (stage, key)"""
+        entry = self.entry(stage, key)
+        if os.path.isdir(entry):
+            return entry
+        stage_dir = os.path.dirname(entry)
+        os.makedirs(stage_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".tmp-", dir=stage_dir)
+        try:
+            for path in paths:
+                shutil.copyfile(path, os.path.join(staging, os.path.basename(path)))
+            os.rename(staging, entry)
+        except OSError:
+            # Another job published the same entry first
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(entry):
+                raise
+        self.prune()
+        return entry
+
+    def prune(self):
+        """Drop least recently used entries until the store fits in max_bytes"""
+        if not self.max_bytes or not os.path.isdir(self.root):
+            return
+        entries = []
+        total = 0
+        for stage in os.listdir(self.root):
+            stage_dir = os.path.join(self.root, stage)
+            for key in os.listdir(stage_dir):
+                if key.startswith(".tmp-"):
+                    continue
+                entry = os.path.join(stage_dir, key)
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry))
+                    entries.append((os.stat(entry).st_mtime, size, entry))
+                except FileNotFoundError:
+                    continue
+                total += size
+        entries.sort()
+        while total > self.max_bytes and entries:
+            _, size, entry = entries.pop(0)
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logger.debug(f"Pruned artifact {entry}")
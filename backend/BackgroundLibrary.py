@@ -0,0 +1,183 @@
+import logging
+import os
+import random
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+from MediaIndex import media_index, RESOURCES_DIR, RESOURCE_FOLDERS
+from ResultCache import CACHE_DIR, cache_key
+
+logger = logging.getLogger(__name__)
+
+# Background videos transcoded for the renderer: already at the final width,
+# with a keyframe every KEYFRAME_INTERVAL seconds and tuned for fast decoding
+LIBRARY_DIR = os.path.join(CACHE_DIR, "backgrounds")
+WIDTH = 1080
+KEYFRAME_INTERVAL = float(os.getenv("BACKGROUND_KEYFRAME_INTERVAL", 1))
+# Transcode backgrounds at startup; set to 0 to always render from the originals
+INGEST = os.getenv("BACKGROUND_INGEST", "1") != "0"
+
+# A lock file not refreshed for this long (seconds) was left behind by a process that died mid-ingest;
+# a live ingest touches its lock every LOCK_TIMEOUT / 4 seconds
+LOCK_TIMEOUT = float(os.getenv("BACKGROUND_LOCK_TIMEOUT", 300))
+
+# Bump when the transcode settings change
+LIBRARY_VERSION = 1
+
+_ingest_lock = threading.Lock()
+
+
+def prepared_path(source):
+    """Where the transcoded copy of source lives; changes when the source file does"""
+    stat = os.stat(source)
+    key = cache_key("background", LIBRARY_VERSION, os.path.abspath(source), stat.st_mtime, stat.st_size,
+                    WIDTH, KEYFRAME_INTERVAL)
+    return os.path.join(LIBRARY_DIR, f"{key[:32]}.mp4")
+
+
+def prepared(source):
+    """Path of the transcoded copy of source, or None if it hasn't been ingested yet"""
+    path = prepared_path(source)
+    return path if os.path.exists(path) else None
+
+
+@contextmanager
+def ingest_lock(path):
+    """
+    Exclusive-create lock file next to path, shared by every server process on the host.
+    Yields False without waiting if another process holds it. The lock is kept fresh
+    while held, and only removed by the holder that wrote it.
+    """
+    lock_path = f"{path}.lock"
+    try:
+        if time.time() - os.path.getmtime(lock_path) > LOCK_TIMEOUT:
+            logger.warning(f"Removing stale ingest lock {lock_path}")
+            os.remove(lock_path)
+    except FileNotFoundError:
+        pass
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        yield False
+        return
+    token = f"{os.getpid()} {uuid.uuid4().hex}"
+    os.write(fd, token.encode())
+    os.close(fd)
+
+    released = threading.Event()
+
+    def refresh():
+        while not released.wait(LOCK_TIMEOUT / 4):
+            try:
+                os.utime(lock_path)
+            except FileNotFoundError:
+                return
+
+    threading.Thread(target=refresh, name="ingest-lock", daemon=True).start()
+    try:
+        yield True
+    finally:
+        released.set()
+        try:
+            with open(lock_path) as f:
+                ours = f.read() == token
+            if ours:
+                os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def transcode_command(source, output, gop):
+    command = ["ffmpeg", "-y", "-v", "error", "-i", source, "-an",
+               "-vf", f"scale={WIDTH}:-2", "-c:v", "libx264", "-preset", "medium", "-crf", "20",
+               "-tune", "fastdecode", "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+               "-pix_fmt", "yuv420p", "-movflags", "+faststart", output]
+    # Lowest CPU priority, renders running next to an ingest get the CPU first
+    if shutil.which("nice"):
+        command = ["nice", "-n", "19", *command]
+    return command
+
+
+def ingest(source, stage=None):
+    """
+    Transcode source into the library unless it is already there. Returns the library path,
+    or None if another process is ingesting it right now.
+    stage(name) must return a context manager holding a worker slot, as in Pipeline; the
+    transcode holds an "ingest" slot and runs at low priority, so renders never wait for it.
+    """
+    path = prepared_path(source)
+    if os.path.exists(path):
+        return path
+    os.makedirs(LIBRARY_DIR, exist_ok=True)
+    with ingest_lock(path) as locked:
+        if not locked:
+            logger.info(f"Background {source} is being ingested by another process")
+            return None
+        # Finished while this process was waiting for the lock
+        if os.path.exists(path):
+            return path
+        fps = media_index.get(source).get("fps") or 30
+        gop = max(1, round(fps * KEYFRAME_INTERVAL))
+        temp_path = f"{path}.{os.getpid()}.tmp.mp4"
+        try:
+            with stage("ingest") if stage else nullcontext():
+                logger.info(f"Ingesting background {source}")
+                # The background's own audio is never used, so it is dropped
+                subprocess.run(transcode_command(source, temp_path, gop), check=True)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return path
+
+
+def ingest_all(stage=None):
+    """Bring the library in line with Resources/Rot, one background at a time (see ingest for stage)"""
+    directory = os.path.join(RESOURCES_DIR, "Rot")
+    if not os.path.isdir(directory):
+        return
+    with _ingest_lock:
+        current = set()
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith(RESOURCE_FOLDERS["Rot"]):
+                continue
+            source = os.path.join(directory, name)
+            try:
+                # Kept even when another process is still making it
+                current.add(prepared_path(source))
+                ingest(source, stage)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.warning(f"Could not ingest background {name}: {e}")
+        # Transcodes of replaced or removed backgrounds
+        for name in os.listdir(LIBRARY_DIR) if os.path.isdir(LIBRARY_DIR) else []:
+            path = os.path.join(LIBRARY_DIR, name)
+            if path not in current and not name.endswith((".tmp.mp4", ".lock")):
+                os.remove(path)
+        logger.info(f"Background library ready: {len([path for path in current if os.path.exists(path)])} videos")
+
+
+def ingest_in_background(stage=None):
+    thread = threading.Thread(target=ingest_all, args=(stage,), name="background-ingest", daemon=True)
+    thread.start()
+    return thread
+
+
+def keyframe_start(meta, duration):
+    """Random start time for a clip of duration seconds that falls on a keyframe, so seeking decodes nothing extra"""
+    latest = meta["duration"] - duration
+    if latest <= 0:
+        return 0
+    keyframes = [time for time in meta.get("keyframes", []) if time <= latest]
+    if keyframes:
+        return random.choice(keyframes)
+    return random.uniform(0, latest)
+
+
+if __name__ == "__main__":
+    # Offline ingest, e.g. at deploy time with BACKGROUND_INGEST=0 on the servers
+    logging.basicConfig(level=logging.INFO)
+    ingest_all()
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the media pipeline on synthetic inputs. Needs ffmpeg on PATH.
+Usage: python backend/Benchmark.py <benchmark> [options]
+"""
+import argparse
+import concurrent.futures
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_tone_mp3(path, seconds, frequency=440):
+    """Mono 24 kHz MP3, the same shape as Google TTS output"""
+    subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"sine=frequency={frequency}:duration={seconds}",
+         "-ar", "24000", "-ac", "1", "-c:a", "libmp3lame", "-b:a", "32k", path],
+        check=True
+    )
+    return path
+
+
+def timed(fn, *args, **kwargs):
+    """Run fn once and return (seconds, peak Python heap bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def report(name, elapsed, peak=None, output=None, extra=""):
+    line = f"{name:<24} {elapsed:8.3f}s"
+    if peak is not None:
+        line += f"  peak heap {peak / 1e6:7.1f} MB"
+    if output and os.path.exists(output):
+        line += f"  output {os.path.getsize(output) / 1e3:9.1f} kB"
+    print(line + extra)
+
+
+def bench_audio_concat(args):
+    """Joining TTS chunks: moviepy decode + re-encode vs. ffmpeg stream copy"""
+    from Images import concat_mp3
+    from moviepy.editor import AudioFileClip, concatenate_audioclips
+
+    def moviepy_concat(paths, output_path):
+        clips = [AudioFileClip(path) for path in paths]
+        concatenate_audioclips(clips).write_audiofile(output_path, fps=44100, nbytes=2, buffersize=2000, logger=None)
+        for clip in clips:
+            clip.close()
+
+    with tempfile.TemporaryDirectory() as work:
+        chunks = [make_tone_mp3(os.path.join(work, f"chunk_{i}.mp3"), args.seconds, 300 + 50 * i)
+                  for i in range(args.chunks)]
+        print(f"Joining {args.chunks} chunks of {args.seconds}s")
+        for name, concat in (("moviepy re-encode", moviepy_concat), ("ffmpeg stream copy", concat_mp3)):
+            output = os.path.join(work, f"{name.split()[0]}.mp3")
+            elapsed, peak = timed(concat, chunks, output)
+            report(name, elapsed, peak, output)
+
+
+class FakeTTS:
+    """
+    Local stand-in for Google TTS: synthesize_speech answers after latency seconds with the
+    MP3 registered for the request's text, except that the first failures[text] calls raise.
+    """
+
+    def __init__(self, audio, latency, failures=None):
+        import collections
+        import threading
+        self.audio = audio
+        self.latency = latency
+        self.failures = failures or {}
+        self.calls = collections.Counter()
+        self._lock = threading.Lock()
+
+    def synthesize_speech(self, request):
+        import types
+        text = request["input"].text
+        with self._lock:
+            self.calls[text] += 1
+            attempt = self.calls[text]
+        time.sleep(self.latency)
+        if attempt <= self.failures.get(text, 0):
+            raise ConnectionError("fake TTS unavailable")
+        return types.SimpleNamespace(audio_content=self.audio[text])
+
+
+def in_order(path, parts):
+    """Whether a sample of every part's audio frames appears in path, in the order given"""
+    with open(path, "rb") as f:
+        data = f.read()
+    positions = [data.find(part[len(part) // 2:len(part) // 2 + 256]) for part in parts]
+    return -1 not in positions and positions == sorted(positions)
+
+
+def bench_tts(args):
+    """cheapSpeak against a local stub TTS service: chunk order, per-chunk retries and wall time"""
+    import Images
+
+    # One sentence just under the request limit per chunk, so every chunk is a request of its own
+    chunks = [f"Chunk {i} " + "word " * 780 + "." for i in range(args.chunks)]
+    text = " ".join(chunks)
+    assert Images.split_text(text) == chunks
+    with tempfile.TemporaryDirectory() as work:
+        audio = {}
+        for i, chunk in enumerate(chunks):
+            with open(make_tone_mp3(os.path.join(work, f"tone_{i}.mp3"), 2, 300 + 100 * i), "rb") as f:
+                audio[chunk] = f.read()
+
+        failures = 0
+        # Every other chunk fails once in the second run and must be retried on its own
+        runs = [("no failures", {}), ("retries", {chunk: 1 for chunk in chunks[1::2]})]
+        for label, failing in runs:
+            client = FakeTTS(audio, args.latency, failing)
+            output = os.path.join(work, f"{label.replace(' ', '_')}.mp3")
+            start = time.perf_counter()
+            Images.cheapSpeak(text, output, client=client)
+            elapsed = time.perf_counter() - start
+            ordered = in_order(output, [audio[chunk] for chunk in chunks])
+            retried = all(client.calls[chunk] == 1 + failing.get(chunk, 0) for chunk in chunks)
+            report(label, elapsed, None, output,
+                   f"  {elapsed / args.latency:4.1f} round trips, {sum(client.calls.values())} calls,"
+                   f" {'in order' if ordered else 'OUT OF ORDER'}")
+            failures += not ordered or not retried
+            # Without failures every chunk is in flight at once, so synthesis takes about one round trip
+            if not failing and args.chunks <= Images.TTS_WORKERS and elapsed > 2 * args.latency:
+                print(f"  expected about one round trip ({args.latency}s), took {elapsed:.2f}s")
+                failures += 1
+        print("chunks in order and retried individually" if not failures else f"{failures} broken runs")
+        if failures:
+            sys.exit(1)
+
+
+def synthetic_timings(seconds, words_per_second=2.8):
+    """Word timings shaped like a narrated script of the given length"""
+    from SrtEdit import WordTimings
+    vocabulary = "no cap this story is lowkey bussin fr fr and the vibes are immaculate ngl".split()
+    timings = WordTimings()
+    step = int(1000 / words_per_second)
+    for i in range(int(seconds * words_per_second)):
+        timings.append(vocabulary[i % len(vocabulary)], i * step, i * step + step - 40)
+    return timings
+
+
+def bench_captions(args):
+    """Caption generation: one event per word vs. one karaoke event per chunk, optionally rendered with libass"""
+    from SrtEdit import srt_to_ass, CAPTION_MODES
+
+    timings = synthetic_timings(args.seconds)
+    font_dir = os.path.abspath("backend/Resources/fonts/static")
+    print(f"{len(timings)} words over {args.seconds}s")
+    with tempfile.TemporaryDirectory() as work:
+        for mode in CAPTION_MODES:
+            ass_path = os.path.join(work, f"{mode}.ass")
+            elapsed, peak = timed(srt_to_ass, timings, ass_path, mode=mode)
+            with open(ass_path, encoding="utf-8") as f:
+                events = sum(1 for line in f if line.startswith("Dialogue:"))
+            report(f"{mode} generate", elapsed, peak, ass_path, f"  {events} events")
+
+            if args.render:
+                # Burn the captions onto a blank frame the size of the final video, discarding the output
+                start = time.perf_counter()
+                subprocess.run(
+                    ["ffmpeg", "-v", "error", "-f", "lavfi",
+                     "-i", f"color=black:size=1080x1920:rate=30:duration={args.seconds}",
+                     "-vf", f"ass={ass_path}:fontsdir={font_dir}", "-f", "null", "-"],
+                    check=True
+                )
+                report(f"{mode} libass render", time.perf_counter() - start)
+
+
+def make_story_directory(path, seconds, frames, color):
+    """A job directory as the pipeline leaves it before rendering: frames, narration and word timings"""
+    from PIL import Image
+    os.makedirs(path)
+    for i in range(frames):
+        Image.new("RGB", (768, 640), color).save(os.path.join(path, f"fram_{i:03d}.png"))
+    make_tone_mp3(os.path.join(path, "story.mp3"), seconds)
+    return synthetic_timings(seconds)
+
+
+def make_background(path, seconds):
+    """Landscape 30 fps clip standing in for a gameplay background"""
+    subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"testsrc=size=1280x720:rate=30:duration={seconds}",
+         "-c:v", "libx264", "-preset", "ultrafast", path],
+        check=True
+    )
+    return path
+
+
+def bench_render_stress(args):
+    """Concurrent renders: every job must come out intact when N renders share the process"""
+    with tempfile.TemporaryDirectory() as work:
+        # Keep the benchmark's media out of the real cache
+        os.environ["CACHE_DIR"] = os.path.join(work, "cache")
+        from FfmpegEditor import EditVid
+        from MediaIndex import probe
+
+        background = make_background(os.path.join(work, "background.mp4"), 90)
+        music = make_tone_mp3(os.path.join(work, "music.mp3"), 90, 220)
+
+        # Different lengths and frame counts per job, so any mixed-up temp file shows in the output
+        jobs = []
+        for i in range(args.jobs):
+            seconds = 10 + 2 * (i % 20)
+            directory = os.path.join(work, f"job_{i}")
+            timings = make_story_directory(directory, seconds, 3 + i, (40 * i % 256, 80, 160))
+            jobs.append((directory, seconds, timings))
+
+        def render(job, name):
+            directory, seconds, timings = job
+            output = EditVid(directory, music, background, output_name=name, timings=timings)
+            actual = probe(output)["duration"] if output else 0
+            return abs(actual - seconds) < 0.25, actual
+
+        runs = [("sequential", 1), (f"{args.jobs} concurrent", args.jobs)]
+        if args.skip_sequential:
+            runs = runs[1:]
+        failures = 0
+        for label, workers in runs:
+            name = f"{label.split()[-1]}.mp4"
+            start = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(lambda job: render(job, name), jobs))
+            report(label, time.perf_counter() - start)
+            for (directory, seconds, _), (ok, actual) in zip(jobs, results):
+                if not ok:
+                    failures += 1
+                    print(f"  {os.path.basename(directory)}: expected {seconds}s, got {actual:.2f}s")
+        print("all renders intact" if not failures else f"{failures} broken renders")
+        if failures:
+            sys.exit(1)
+
+
+def bench_profiles(args):
+    """Encode speed and output size of every render profile on a synthetic vertical video"""
+    from RenderProfiles import PROFILES
+
+    frames = args.seconds * 30
+    with tempfile.TemporaryDirectory() as work:
+        for profile in PROFILES.values():
+            output = os.path.join(work, f"{profile.name}.mp4")
+            start = time.perf_counter()
+            subprocess.run(
+                ["ffmpeg", "-y", "-v", "error",
+                 "-f", "lavfi", "-i", f"testsrc2=size=1080x1920:rate=30:duration={args.seconds}",
+                 "-f", "lavfi", "-i", f"sine=frequency=440:duration={args.seconds}",
+                 *profile.ffmpeg_args(), output],
+                check=True
+            )
+            elapsed = time.perf_counter() - start
+            report(profile.name, elapsed, None, output, f"  {frames / elapsed:6.1f} fps")
+
+
+def bench_segments(args):
+    """Single-pass render vs. the same render split into parallel segments"""
+    with tempfile.TemporaryDirectory() as work:
+        os.environ["CACHE_DIR"] = os.path.join(work, "cache")
+        from FfmpegEditor import EditVid
+        from MediaIndex import probe
+
+        background = make_background(os.path.join(work, "background.mp4"), args.seconds + 30)
+        music = make_tone_mp3(os.path.join(work, "music.mp3"), args.seconds + 30, 220)
+        directory = os.path.join(work, "job")
+        timings = make_story_directory(directory, args.seconds, args.frames, (30, 90, 150))
+
+        for segments in (1, args.segments):
+            name = f"segments_{segments}.mp4"
+            start = time.perf_counter()
+            output = EditVid(directory, music, background, output_name=name, timings=timings, segments=segments)
+            elapsed = time.perf_counter() - start
+            actual = probe(output)["duration"] if output else 0
+            report(f"{segments} segment{'s' if segments > 1 else ''}", elapsed, None, output,
+                   f"  duration {actual:.2f}s of {args.seconds}s")
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def bench_frames(args):
+    """Raw 768x640 frames scaled in every render vs. frames finished once to the render size"""
+    with tempfile.TemporaryDirectory() as work:
+        os.environ["CACHE_DIR"] = os.path.join(work, "cache")
+        from PIL import Image
+        from FfmpegEditor import EditVid, get_image_files_from_directory
+        import Images
+
+        background = make_background(os.path.join(work, "background.mp4"), args.seconds + 30)
+        music = make_tone_mp3(os.path.join(work, "music.mp3"), args.seconds + 30, 220)
+        directories = {}
+        for label in ("raw", "finished"):
+            directory = os.path.join(work, label)
+            timings = make_story_directory(directory, args.seconds, args.frames, (30, 90, 150))
+            # Noise compresses about as badly as a generated image, flat colour doesn't
+            for path in get_image_files_from_directory(directory):
+                Image.effect_noise((Images.IMAGE_WIDTH, Images.IMAGE_HEIGHT), 64).convert("RGB").save(path)
+            directories[label] = directory
+        print(f"raw frames: {directory_size(directories['raw']) / 1e3:.1f} kB")
+
+        paths = get_image_files_from_directory(directories["finished"])
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=Images.FRAME_WORKERS) as pool:
+            list(pool.map(Images.finish_frame, paths))
+        report(f"finish {len(paths)} frames", time.perf_counter() - start, None, None,
+               f"  {directory_size(directories['finished']) / 1e3:.1f} kB")
+
+        for label, directory in directories.items():
+            start = time.perf_counter()
+            output = EditVid(directory, music, background, output_name=f"{label}.mp4", timings=timings)
+            report(f"render {label}", time.perf_counter() - start, None, output)
+
+
+def fake_together(latency, error_rate, image_bytes):
+    """
+    Local stand-in for Together's image API: generations answer after latency seconds
+    (or fail with a retryable error at error_rate) and link to an image of image_bytes.
+    Returns the server, the set of client connections it saw and a list of the
+    image downloads that carried an Authorization header (there should be none).
+    """
+    import json
+    import random
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    connections = set()
+    leaks = []
+    payload = os.urandom(image_bytes)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, body, content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            connections.add(self.client_address)
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not self.headers.get("Authorization"):
+                return self.reply(401, b'{"error": "missing API key"}')
+            time.sleep(latency)
+            if random.random() < error_rate:
+                return self.reply(random.choice((429, 503)), b'{"error": "try again"}')
+            host, port = self.server.server_address
+            self.reply(200, json.dumps({"data": [{"url": f"http://{host}:{port}/image.png"}]}).encode())
+
+        def do_GET(self):
+            connections.add(self.client_address)
+            if self.headers.get("Authorization"):
+                leaks.append(self.path)
+            self.reply(200, payload, "image/png")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, connections, leaks
+
+
+def bench_image_client(args):
+    """Image generation through ImageClient against a local fake Together endpoint"""
+    from ImageClient import ImageClient
+
+    server, connections, leaks = fake_together(args.latency, args.error_rate, args.kilobytes * 1024)
+    host, port = server.server_address
+    client = ImageClient(api_key="fake", base_url=f"http://{host}:{port}/v1", max_workers=args.workers,
+                         rate=args.rate)
+    with tempfile.TemporaryDirectory() as work:
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.images) as pool:
+            paths = list(pool.map(
+                lambda i: client.generate(f"prompt {i}", os.path.join(work, f"fram_{i}.png"),
+                                          model="fake", width=768, height=640, steps=4),
+                range(args.images)
+            ))
+        elapsed = time.perf_counter() - start
+        intact = sum(os.path.getsize(path) == args.kilobytes * 1024 for path in paths)
+    server.shutdown()
+    report(f"{args.images} images", elapsed, None, None,
+           f"  {intact} intact, {len(connections)} connections, {args.workers} workers,"
+           f" {len(leaks)} downloads with credentials")
+
+
+BENCHMARKS = {
+    "audio-concat": bench_audio_concat,
+    "captions": bench_captions,
+    "render-stress": bench_render_stress,
+    "profiles": bench_profiles,
+    "segments": bench_segments,
+    "image-client": bench_image_client,
+    "frames": bench_frames,
+    "tts": bench_tts,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="benchmark", required=True)
+
+    audio = commands.add_parser("audio-concat", help=bench_audio_concat.__doc__)
+    audio.add_argument("--chunks", type=int, default=6)
+    audio.add_argument("--seconds", type=float, default=60)
+
+    captions = commands.add_parser("captions", help=bench_captions.__doc__)
+    captions.add_argument("--seconds", type=int, default=60)
+    captions.add_argument("--render", action="store_true", help="also time the ass filter in ffmpeg")
+
+    stress = commands.add_parser("render-stress", help=bench_render_stress.__doc__)
+    stress.add_argument("--jobs", type=int, default=os.cpu_count() or 4)
+    stress.add_argument("--skip-sequential", action="store_true")
+
+    profiles = commands.add_parser("profiles", help=bench_profiles.__doc__)
+    profiles.add_argument("--seconds", type=int, default=20)
+
+    segments = commands.add_parser("segments", help=bench_segments.__doc__)
+    segments.add_argument("--segments", type=int, default=os.cpu_count() or 4)
+    segments.add_argument("--seconds", type=int, default=60)
+    segments.add_argument("--frames", type=int, default=20)
+
+    images = commands.add_parser("image-client", help=bench_image_client.__doc__)
+    images.add_argument("--images", type=int, default=40)
+    images.add_argument("--workers", type=int, default=4)
+    images.add_argument("--rate", type=float, default=0, help="generation requests per second, 0 for no limit")
+    images.add_argument("--latency", type=float, default=0.2)
+    images.add_argument("--error-rate", type=float, default=0.1)
+    images.add_argument("--kilobytes", type=int, default=500)
+
+    frames = commands.add_parser("frames", help=bench_frames.__doc__)
+    frames.add_argument("--seconds", type=int, default=60)
+    frames.add_argument("--frames", type=int, default=24)
+
+    tts = commands.add_parser("tts", help=bench_tts.__doc__)
+    tts.add_argument("--chunks", type=int, default=4, help="keep at most TTS_WORKERS to check the wall time")
+    tts.add_argument("--latency", type=float, default=1.0)
+
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
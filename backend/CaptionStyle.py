@@ -0,0 +1,247 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, asdict, replace
+from functools import lru_cache
+
+from PIL import ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Bundled fonts; a style's font_file is relative to this directory
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Resources", "fonts")
+
+
+@dataclass(frozen=True)
+class CaptionStyle:
+    """
+    Everything that decides how captions look and how they are broken into chunks and lines.
+    Field names follow the ASS [V4+ Styles] section; widths are in PlayRes pixels.
+    """
+    name: str
+    font_file: str = "static/Montserrat-BlackItalic.ttf"
+    font_name: str = "Montserrat-BlackItalic"
+    font_size: int = 200
+    primary_colour: str = "&H0002c2e8"
+    # Karaoke words that are not revealed yet; fully transparent so they stay hidden
+    secondary_colour: str = "&HFF000000"
+    outline_colour: str = "&H00000000"
+    back_colour: str = "&H00000000"
+    bold: bool = True
+    italic: bool = True
+    scale_x: int = 100
+    spacing: float = 0
+    outline: float = 4
+    shadow: float = 0
+    alignment: int = 5
+    margin_l: int = 10
+    margin_r: int = 10
+    margin_v: int = 200
+    play_res_x: int = 1080
+    play_res_y: int = 1920
+    # Most lines a caption chunk may take
+    max_lines: int = 2
+    # Pacing limit, at most this many characters are on screen at once
+    max_chars: int = 30
+    # Spread a chunk over max_lines lines even when it would fit on fewer
+    balance: bool = True
+
+    @property
+    def font_path(self):
+        return os.path.join(FONT_DIR, self.font_file)
+
+    @property
+    def line_width(self):
+        """Widest a line may be without touching the margins"""
+        return self.play_res_x - self.margin_l - self.margin_r - 2 * self.outline
+
+    def ass_style(self, name="Default"):
+        """The style as a line of the ASS [V4+ Styles] section"""
+        return (f"Style: {name},{self.font_name},{self.font_size},{self.primary_colour},{self.secondary_colour},"
+                f"{self.outline_colour},{self.back_colour},{int(self.bold)},{int(self.italic)},0,0,"
+                f"{self.scale_x},100,{self.spacing},0,1,{self.outline},{self.shadow},{self.alignment},"
+                f"{self.margin_l},{self.margin_r},{self.margin_v},1")
+
+    def layout(self, words):
+        """Break words into caption chunks that fit the style, see CaptionChunk"""
+        measure = text_measure(self.font_path, self.font_size)
+        widths = [measure.width(word) * self.scale_x / 100 + self.spacing * len(word) for word in words]
+        space = measure.width(" ") * self.scale_x / 100 + self.spacing
+        return layout_chunks(words, widths, space, self)
+
+
+@dataclass
+class CaptionChunk:
+    """
+    Words[start:end] shown together. breaks holds the offsets inside the chunk where a new
+    line starts; scale is below 100 when a single word is too wide and has to be shrunk.
+    """
+    start: int
+    end: int
+    breaks: tuple
+    scale: int = 100
+
+
+class TextMeasure:
+    """
+    Glyph advances of one font at one ASS font size, cached per word.
+    libass sizes a font so that ascent + descent equals the font size, which is
+    larger than the em size Pillow uses, so widths are scaled to match.
+    """
+
+    def __init__(self, font_path, size):
+        self._font = ImageFont.truetype(font_path, size)
+        ascent, descent = self._font.getmetrics()
+        self.scale = size / (ascent + descent)
+        self._widths = {}
+        # FreeType faces must not be used from several threads at once
+        self._lock = threading.Lock()
+
+    def width(self, text):
+        width = self._widths.get(text)
+        if width is None:
+            with self._lock:
+                width = self._font.getlength(text) * self.scale
+            self._widths[text] = width
+        return width
+
+
+@lru_cache(maxsize=None)
+def text_measure(font_path, size):
+    return TextMeasure(font_path, size)
+
+
+def line_widths(widths, space, breaks):
+    """Width of each line when a run of words is broken before the offsets in breaks"""
+    bounds = (0,) + tuple(breaks) + (len(widths),)
+    return [sum(widths[a:b]) + space * (b - a - 1) for a, b in zip(bounds, bounds[1:])]
+
+
+def greedy_breaks(widths, space, limit):
+    """Fill each line as far as it goes"""
+    breaks = []
+    current = 0
+    for i, width in enumerate(widths):
+        if i and current + space + width > limit:
+            breaks.append(i)
+            current = width
+        else:
+            current = current + space + width if i else width
+    return breaks
+
+
+def balanced_breaks(widths, space, lines):
+    """Split into exactly lines lines, keeping the widest one as narrow as possible"""
+    n = len(widths)
+    lines = min(lines, n)
+    # best[k][i]: (widest line, breaks) for the first i words on k lines
+    best = [{0: (0, ())}] + [{} for _ in range(lines)]
+    for k in range(1, lines + 1):
+        for i in range(k, n - (lines - k) + 1):
+            options = []
+            for j in range(k - 1, i):
+                if j not in best[k - 1]:
+                    continue
+                widest, breaks = best[k - 1][j]
+                line = sum(widths[j:i]) + space * (i - j - 1)
+                options.append((max(widest, line), breaks + ((j,) if j else ())))
+            if options:
+                best[k][i] = min(options)
+    return list(best[lines][n][1])
+
+
+def layout_chunks(words, widths, space, style):
+    """Group words into chunks of at most max_lines lines of line_width and max_chars characters"""
+    limit = style.line_width
+
+    def fits(start, end):
+        if max(widths[start:end]) > limit:
+            return False
+        chars = sum(len(word) for word in words[start:end]) + end - start - 1
+        if end - start > 1 and chars > style.max_chars:
+            return False
+        return len(greedy_breaks(widths[start:end], space, limit)) < style.max_lines
+
+    chunks = []
+    start = 0
+    for end in range(1, len(words) + 1):
+        if end - start > 1 and not fits(start, end):
+            chunks.append((start, end - 1))
+            start = end - 1
+    if start < len(words):
+        chunks.append((start, len(words)))
+
+    result = []
+    for start, end in chunks:
+        chunk_widths = widths[start:end]
+        if style.balance and style.max_lines > 1:
+            breaks = balanced_breaks(chunk_widths, space, style.max_lines)
+        else:
+            breaks = greedy_breaks(chunk_widths, space, limit)
+        widest = max(line_widths(chunk_widths, space, breaks))
+        # Only a lone word can still be too wide, shrink it to fit
+        scale = 100 if widest <= limit else int(100 * limit / widest)
+        result.append(CaptionChunk(start, end, tuple(breaks), scale))
+    return result
+
+
+# Named caption styles; add more with register_style or a CAPTION_STYLES_FILE
+STYLES = {}
+
+# Style used when a job doesn't pick one
+DEFAULT_STYLE = os.getenv("CAPTION_STYLE", "default")
+
+
+def register_style(style):
+    STYLES[style.name] = style
+    return style
+
+
+def get_style(name=None):
+    """Look up a style by name (None for the default); passes CaptionStyle instances through"""
+    if isinstance(name, CaptionStyle):
+        return name
+    name = name or DEFAULT_STYLE
+    if name not in STYLES:
+        raise ValueError(f"Unknown caption style: {name}")
+    return STYLES[name]
+
+
+def load_styles(path):
+    """
+    Register the styles in a JSON file: a list of objects with CaptionStyle fields.
+    An object may name a "base" style whose fields it starts from.
+    """
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    for entry in entries:
+        entry = dict(entry)
+        base = entry.pop("base", None)
+        if base:
+            style = replace(get_style(base), **entry)
+        else:
+            style = CaptionStyle(**entry)
+        register_style(style)
+        logger.debug(f"Loaded caption style {style.name} from {path}")
+
+
+def describe_styles():
+    """All registered styles as plain dicts, for the API"""
+    return [asdict(style) for style in STYLES.values()]
+
+
+# The original look: big yellow italic words in the middle of the frame
+register_style(CaptionStyle("default"))
+# Smaller white captions with a heavy outline, low in the frame
+register_style(CaptionStyle(
+    "clean", font_file="static/Montserrat-ExtraBold.ttf", font_name="Montserrat-ExtraBold", font_size=110,
+    primary_colour="&H00FFFFFF", italic=False, outline=6, alignment=2, margin_v=320, max_chars=40, balance=False,
+))
+# A single line of a few words at a time
+register_style(CaptionStyle(
+    "one-line", font_size=150, max_lines=1, max_chars=20,
+))
+
+if os.getenv("CAPTION_STYLES_FILE"):
+    load_styles(os.getenv("CAPTION_STYLES_FILE"))
@@ -1,42 +1,81 @@
 import subprocess
 import os
 import random
+import tempfile
+import concurrent.futures
 from SrtEdit import *
+from CaptionStyle import get_style
+from RenderProfiles import get_profile
+from MediaIndex import media_index, probe
+import BackgroundLibrary
+from PIL import Image
 
-def EditVid(directory=None, music=None, video=None):
+# Draft previews: width of the video and how many seconds from the start to render (0 for all of it)
+PREVIEW_WIDTH = int(os.getenv("PREVIEW_WIDTH", 360))
+PREVIEW_SECONDS = float(os.getenv("PREVIEW_SECONDS", 0))
+
+# Encode the video as this many segments in parallel ffmpeg processes (1 for a single pass)
+RENDER_SEGMENTS = int(os.getenv("RENDER_SEGMENTS", 1))
+
+def EditVid(directory=None, music=None, video=None, timeout=None, output_name="output.mp4", timings=None,
+            caption_style=None, render_profile=None, preview=False, segments=None):
+    """
+    Render the job in directory to directory/output_name. With preview, a quick low resolution
+    draft with the fast-preview profile, cut to PREVIEW_SECONDS if that is set.
+    segments > 1 splits the encode across processes, see render_segments.
+    """
     if not directory:
         dir = "frames/03_16_13-42-03"
     else:
         dir = directory
     audio = f"{dir}/story.mp3"
     
+    rot_roll, background_music = media_paths(music, video)
+    srt_file = f"{dir}/story.srt"
+    
+    # Output file path - save in the directory
+    output_file = f"{dir}/{output_name}"
+    
+    # Everything this render writes besides the output goes in its own directory,
+    # so any number of renders can run side by side
+    profile = get_profile("fast-preview" if preview else render_profile)
+    with tempfile.TemporaryDirectory(prefix="render-") as work:
+        return render_video(dir, work, audio, rot_roll, background_music, srt_file, output_file,
+                            timeout, timings, get_style(caption_style), profile, preview,
+                            1 if preview else segments or RENDER_SEGMENTS)
+
+def media_paths(music=None, video=None):
+    """Background video and music files for the selected names (absolute paths are used as they are)"""
     # Use the selected background video if provided, otherwise default to minecraft.mp4
     if video and video != "none":
-        rot_roll = f"backend/Resources/Rot/{video}"
+        rot_roll = os.path.join("backend/Resources/Rot", video)
     else:
         rot_roll = "backend/Resources/Rot/minecraft.mp4"
         
-    srt_file = f"{dir}/story.srt"
     if music and music != "none":
-        background_music = f"backend/Resources/Music/{music}"
+        background_music = os.path.join("backend/Resources/Music", music)
     else:
         background_music = "backend/Resources/Music/Espresso.mp3"
-    
-    # Output file path - save in the directory
-    output_file = f"{dir}/output.mp4"
-    
-    #rewrite srt file to ass
-    srt_to_ass(srt_file)
-    ass_file = f"{dir}/story.ass"
+    return rot_roll, background_music
+
+def prepare_media(music=None, video=None):
+    """Make sure everything EditVid needs to know about the background and music is indexed"""
+    rot_roll, background_music = media_paths(music, video)
+    media_index.get(BackgroundLibrary.prepared(rot_roll) or rot_roll)
+    media_index.get(background_music)
+
+def render_video(dir, work, audio, rot_roll, background_music, srt_file, output_file, timeout, timings, style,
+                 profile, preview=False, segments=1):
+    #write the captions as ass, straight from in-memory word timings when we have them
+    ass_file = os.path.join(work, "story.ass")
+    srt_to_ass(timings if timings is not None else srt_file, ass_file, style=style)
     
     # Set absolute font directory path for the fontconfig
-    cwd = os.getcwd()
-    font_dir = os.path.join(cwd, "backend/Resources/fonts/static")
-    font_file = os.path.join(font_dir, "Montserrat-BlackItalic.ttf")
+    font_file = style.font_path
+    font_dir = os.path.dirname(font_file)
     
-    # Get audio duration using ffprobe
-    duration_cmd = f'ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 {audio}'
-    duration = float(subprocess.check_output(duration_cmd, shell=True).decode('utf-8').strip())
+    # Get audio duration using ffprobe, the narration is new for every job so it isn't indexed
+    duration = probe(audio)["duration"]
     
     # Check if there's a custom duration.txt file, and use that instead if available
     duration_file = f"{dir}/duration.txt"
@@ -59,20 +98,25 @@ def EditVid(directory=None, music=None, video=None):
         duration = 60
     print(f"Final video duration: {duration} seconds")
     
-    # Count the number of PNG files in the directory
-    number_frames = len([file for file in os.listdir(dir) if file.lower().endswith('.png')])
+    # Get image files, sorted to ensure correct order
+    image_files = get_image_files_from_directory(dir)
+    image_files.sort()
+    number_frames = len(image_files)
+    # Frames finished by Images.finish_frame are already at the final width and only need stacking
+    with Image.open(image_files[0]) as first:
+        frames_ready = first.width == 1080 and first.height % 2 == 0
     
-    # Get rot_roll video duration using ffprobe
-    rot_roll_duration_cmd = f'ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 {rot_roll}'
-    rot_roll_duration = float(subprocess.check_output(rot_roll_duration_cmd, shell=True).decode('utf-8').strip())
+    # Prefer the pre-scaled, keyframe-dense copy of the background once it has been ingested
+    prepared_roll = BackgroundLibrary.prepared(rot_roll)
+    if prepared_roll:
+        rot_roll = prepared_roll
     
-    # Calculate random start time for rot_roll video
-    max_start_time = max(0, rot_roll_duration - duration)
-    rot_start = random.uniform(0, max_start_time) if max_start_time > 0 else 0
+    # Random start time for rot_roll video, on a keyframe so seeking is cheap
+    # (durations and keyframes come from the media index, probed once per file)
+    rot_start = BackgroundLibrary.keyframe_start(media_index.get(rot_roll), duration)
 
     # New: Calculate random start time for background music
-    bg_duration_cmd = f'ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 {background_music}'
-    bg_duration = float(subprocess.check_output(bg_duration_cmd, shell=True).decode('utf-8').strip())
+    bg_duration = media_index.duration(background_music)
     max_bg_start = max(0, bg_duration - duration)
     bg_start = random.uniform(0, max_bg_start) if max_bg_start > 0 else 0
     print(f"Background music start: {bg_start} seconds")
@@ -80,73 +124,153 @@ def EditVid(directory=None, music=None, video=None):
     duration_each_frame = duration / number_frames
     frame_rate = 1/duration_each_frame
     
-    # Get image files
-    image_files = get_image_files_from_directory(dir)
-    # Sort image files to ensure correct order
-    image_files.sort()
-    
-    # Create a temporary file list for ffmpeg
-    temp_file_list = "temp_file_list.txt"
-    with open(temp_file_list, 'w') as f:
-        for img in image_files:
-            f.write(f"file '{img}'\n")
-            f.write(f"duration {duration_each_frame}\n")
+    # A preview keeps the full video's pacing and only stops early
+    output_duration = duration
+    if preview and PREVIEW_SECONDS:
+        output_duration = min(duration, PREVIEW_SECONDS)
+    # Scaled down before the captions, libass lays them out for the smaller frame
+    preview_scale = f",scale={PREVIEW_WIDTH}:-2" if preview else ""
     
-    print(f"Number of images: {len(image_files)}")
+    print(f"Number of images: {number_frames}{' (render-ready)' if frames_ready else ''}")
     # Print out key values
     print(f"Rot start: {rot_start} seconds")
     print(f"Duration per frame: {duration_each_frame} seconds")
     print(f"Frame rate: {frame_rate} fps")
     print(f"Using font: {font_file}")
+    print(f"Render profile: {profile.name}")
     
     # Create a temporary fonts.conf file to help FFmpeg find the font
-    fonts_conf = "temp_fonts.conf"
+    fonts_conf = os.path.join(work, "fonts.conf")
     with open(fonts_conf, 'w') as f:
         f.write(f'''<?xml version="1.0"?>
 <!DOCTYPE fontconfig SYSTEM "fonts.dtd">
 <fontconfig>
     <dir>{font_dir}</dir>
     <match target="pattern">
-        <test qual="any" name="family"><string>Montserrat-BlackItalic</string></test>
-        <edit name="family" mode="assign" binding="same"><string>Montserrat-BlackItalic</string></edit>
+        <test qual="any" name="family"><string>{style.font_name}</string></test>
+        <edit name="family" mode="assign" binding="same"><string>{style.font_name}</string></edit>
     </match>
 </fontconfig>''')
     
-    # Set environment variable for fontconfig
-    os.environ['FONTCONFIG_FILE'] = os.path.abspath(fonts_conf)
-    
-    # Fixed command with proper stream indexing and output to the correct directory
-    command = (f'ffmpeg -ss {rot_start} -i {rot_roll} '  # Input 0: rot_roll video
-               f'-f concat -safe 0 -i {temp_file_list} '  # Input 1: image sequence from file list
-               f'-i {audio} '  # Input 2: story audio
-               f'-ss {bg_start} -i {background_music} '  # Input 3: background music with random start
-               f'-filter_complex "'
-               f'[0:v]scale=1080:-2[scaled_video];'  # Scale rot_roll to 1080 width and ensure even height
-               f'[1:v]scale=1080:-2[scaled_images];'  # Scale images to 1080 width and ensure even height
-               f'[scaled_video][scaled_images]vstack=inputs=2[stacked];'  # Stack them vertically
-               f'[stacked]pad=iw:ih+mod(ih\,2):0:0[temp];'  # Pad height to make it even if needed
-               f'[temp]ass={ass_file}:fontsdir={font_dir}[v];'  # Apply subtitles with font directory
-               f'[3:a]volume=0.1[quietbg];'  # Background music volume
-               f'[2:a][quietbg]amix=inputs=2:duration=first[a]" '  # Mix audio
-               f'-map "[v]" -map "[a]" -t {duration} {output_file}')
-               
-    print(command)
-    # Execute the command
-    result = subprocess.run(command, shell=True)
+    # fontconfig is pointed at our fonts.conf for this ffmpeg process only
+    env = dict(os.environ, FONTCONFIG_FILE=fonts_conf)
     
-    if result.returncode != 0:
-        print(f"Error creating video, ffmpeg returned code {result.returncode}")
-        return None
+    segments = min(segments, len(image_files))
+    if segments > 1:
+        fps = media_index.get(rot_roll).get("fps") or 30
+        ok = render_segments(work, env, segments, fps, image_files, duration_each_frame, output_duration,
+                             rot_roll, rot_start, prepared_roll, frames_ready, audio, background_music, bg_start,
+                             ass_file, font_dir, profile, output_file, timeout)
+    else:
+        # Create a temporary file list for ffmpeg
+        temp_file_list = write_file_list(os.path.join(work, "file_list.txt"), image_files, duration_each_frame)
+        
+        filter_graph = (
+            video_filter(prepared_roll, frames_ready, ass_file, font_dir, preview_scale) + ';' +
+            f'[3:a]volume=0.1[quietbg];'  # Background music volume
+            f'[2:a][quietbg]amix=inputs=2:duration=first[a]'  # Mix audio
+        )
+        # Fixed command with proper stream indexing and output to the correct directory
+        command = ['ffmpeg', '-y', '-nostdin',
+                   '-ss', str(rot_start), '-i', rot_roll,  # Input 0: rot_roll video
+                   '-f', 'concat', '-safe', '0', '-i', temp_file_list,  # Input 1: image sequence from file list
+                   '-i', audio,  # Input 2: story audio
+                   '-ss', str(bg_start), '-i', background_music,  # Input 3: background music with random start
+                   '-filter_complex', filter_graph,
+                   '-map', '[v]', '-map', '[a]', '-t', str(output_duration),
+                   *profile.ffmpeg_args(), output_file]
+        ok = run_ffmpeg(command, env, timeout)
     
-    # Clean up temp files
-    if os.path.exists(temp_file_list):
-        os.remove(temp_file_list)
-    if os.path.exists(fonts_conf):
-        os.remove(fonts_conf)
+    if not ok:
+        return None
     
     print(f"Video created successfully at: {output_file}")
     return output_file
 
+def write_file_list(path, image_files, duration_each_frame):
+    """ffmpeg concat list showing each image for duration_each_frame seconds"""
+    with open(path, 'w') as f:
+        for img in image_files:
+            # Absolute, the list lives in the render's temp directory
+            f.write(f"file '{os.path.abspath(img)}'\n")
+            f.write(f"duration {duration_each_frame}\n")
+    return path
+
+def video_filter(prepared_roll, frames_ready, ass_file, font_dir, preview_scale="", offset=0):
+    """
+    Filter graph from the background (input 0) and the images (input 1) to the captioned [v].
+    offset is where the input starts on the video's timeline, so the captions line up in a segment.
+    """
+    if offset:
+        captions = f'setpts=PTS+{offset}/TB,ass={ass_file}:fontsdir={font_dir},setpts=PTS-STARTPTS'
+    else:
+        captions = f'ass={ass_file}:fontsdir={font_dir}'
+    return (
+        f'[0:v]{"copy" if prepared_roll else "scale=1080:-2"}[scaled_video];'  # Scale rot_roll to 1080 width unless ingested at that width
+        f'[1:v]{"copy" if frames_ready else "scale=1080:-2"}[scaled_images];'  # Scale images to 1080 width and even height unless finished at that size
+        f'[scaled_video][scaled_images]vstack=inputs=2[stacked];'  # Stack them vertically
+        f'[stacked]pad=iw:ih+mod(ih\\,2):0:0{preview_scale}[temp];'  # Pad height to make it even if needed
+        f'[temp]{captions}[v]'  # Apply subtitles with font directory
+    )
+
+def run_ffmpeg(command, env, timeout):
+    print(" ".join(command))
+    result = subprocess.run(command, env=env, timeout=timeout)
+    if result.returncode != 0:
+        print(f"Error creating video, ffmpeg returned code {result.returncode}")
+        return False
+    return True
+
+def render_segments(work, env, segments, fps, image_files, duration_each_frame, duration, rot_roll, rot_start,
+                    prepared_roll, frames_ready, audio, background_music, bg_start, ass_file, font_dir, profile,
+                    output_file, timeout):
+    """
+    Encode the video as segments in parallel ffmpeg processes and join them with a stream copy.
+    Segments start on an image boundary, rounded to a whole output frame, and are encoded
+    with the same settings so they concatenate cleanly; the audio is mixed once, alongside.
+    """
+    # Image index each segment starts at, and its start time on the video's timeline
+    first_images = [round(k * len(image_files) / segments) for k in range(segments)]
+    starts = [round(i * duration_each_frame * fps) / fps for i in first_images]
+    bounds = [start for start in starts if start < duration] + [duration]
+    threads = max(1, (os.cpu_count() or 1) // segments)
+    print(f"Rendering {len(bounds) - 1} segments with {threads} threads each")
+    
+    commands = []
+    segment_files = []
+    for k, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        last_image = first_images[k + 1] if k + 1 < segments else len(image_files)
+        file_list = write_file_list(os.path.join(work, f"file_list_{k}.txt"),
+                                    image_files[first_images[k]:last_image], duration_each_frame)
+        segment_file = os.path.join(work, f"segment_{k}.mp4")
+        commands.append(['ffmpeg', '-y', '-nostdin', '-v', 'error',
+                         '-ss', str(rot_start + start), '-i', rot_roll,
+                         '-f', 'concat', '-safe', '0', '-i', file_list,
+                         '-filter_complex', video_filter(prepared_roll, frames_ready, ass_file, font_dir, offset=start),
+                         '-map', '[v]', '-t', str(end - start), '-r', str(fps),
+                         *profile.video_args(threads), segment_file])
+        segment_files.append(segment_file)
+    
+    mixed_audio = os.path.join(work, "audio.m4a")
+    commands.append(['ffmpeg', '-y', '-nostdin', '-v', 'error',
+                     '-i', audio, '-ss', str(bg_start), '-i', background_music,
+                     '-filter_complex', '[1:a]volume=0.1[quietbg];[0:a][quietbg]amix=inputs=2:duration=first[a]',
+                     '-map', '[a]', '-t', str(duration), *profile.audio_args(), mixed_audio])
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(commands)) as pool:
+        results = list(pool.map(lambda command: run_ffmpeg(command, env, timeout), commands))
+    if not all(results):
+        return False
+    
+    segment_list = os.path.join(work, "segments.txt")
+    with open(segment_list, 'w') as f:
+        for segment_file in segment_files:
+            f.write(f"file '{segment_file}'\n")
+    return run_ffmpeg(['ffmpeg', '-y', '-nostdin',
+                       '-f', 'concat', '-safe', '0', '-i', segment_list, '-i', mixed_audio,
+                       '-map', '0:v', '-map', '1:a', '-c', 'copy', '-movflags', '+faststart',
+                       '-t', str(duration), output_file], env, timeout)
+
 def get_image_files_from_directory(directory):
     image_files = []
     for file_name in os.listdir(directory):
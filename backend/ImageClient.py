@@ -0,0 +1,155 @@
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Together's REST API; point it at a local fake to test without the real service
+TOGETHER_BASE_URL = os.getenv("TOGETHER_BASE_URL", "https://api.together.xyz/v1")
+# Images generated at the same time, per process
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 4))
+# Attempts per request before giving up
+IMAGE_RETRIES = int(os.getenv("IMAGE_RETRIES", 4))
+# Connect and read timeouts in seconds
+IMAGE_CONNECT_TIMEOUT = float(os.getenv("IMAGE_CONNECT_TIMEOUT", 10))
+IMAGE_READ_TIMEOUT = float(os.getenv("IMAGE_READ_TIMEOUT", 120))
+# Generation requests per second allowed to each provider (0 for no limit)
+IMAGE_RATE_LIMIT = float(os.getenv("IMAGE_RATE_LIMIT", 5))
+
+# Worth another try: timeouts, rate limiting and server-side errors
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """Spaces out calls so that at most rate of them start per second, shared between threads"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+# One limiter per provider host, so every client talking to it shares the budget
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def provider_limiter(base_url, rate):
+    host = urlparse(base_url).netloc
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = RateLimiter(rate)
+        return _limiters[host]
+
+
+class RetryableError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Dropped connections and timeouts, including a body cut short partway through a download
+RETRYABLE_ERRORS = (RetryableError, requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)
+
+
+class ImageClient:
+    """
+    Client for Together's image generation REST API.
+    Requests go through one keep-alive session sized for max_workers connections,
+    at most max_workers of them run at once, generation calls are rate limited per
+    provider, and failed calls are retried with jittered exponential backoff.
+    """
+
+    def __init__(self, api_key=None, base_url=None, max_workers=None, retries=None, timeout=None, rate=None):
+        self.base_url = (base_url or TOGETHER_BASE_URL).rstrip("/")
+        self.max_workers = max_workers or IMAGE_WORKERS
+        self.retries = retries or IMAGE_RETRIES
+        self.timeout = timeout or (IMAGE_CONNECT_TIMEOUT, IMAGE_READ_TIMEOUT)
+        self._limiter = provider_limiter(self.base_url, IMAGE_RATE_LIMIT if rate is None else rate)
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Sent only to the API; the image URLs it returns can be on other hosts (CDNs, pre-signed storage URLs)
+        self._auth = {"Authorization": f"Bearer {api_key or os.environ.get('TOGETHER_AI')}"}
+
+    def _retry(self, what, fn, *args):
+        for attempt in range(1, self.retries + 1):
+            try:
+                return fn(*args)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.retries:
+                    raise
+                # Full jitter, so threads that failed together don't retry together
+                delay = getattr(e, "retry_after", None) or random.uniform(0, 2 ** attempt)
+                logger.warning(f"{what} failed (attempt {attempt}/{self.retries}): {e}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    @staticmethod
+    def _check(response):
+        if response.status_code in RETRY_STATUSES:
+            retry_after = response.headers.get("Retry-After")
+            raise RetryableError(f"HTTP {response.status_code}",
+                                 float(retry_after) if retry_after and retry_after.isdigit() else None)
+        response.raise_for_status()
+
+    def _generate(self, payload):
+        self._limiter.wait()
+        response = self.session.post(f"{self.base_url}/images/generations", json=payload, headers=self._auth,
+                                     timeout=self.timeout)
+        self._check(response)
+        return response.json()["data"][0]["url"]
+
+    def _download(self, url, path):
+        temp_path = f"{path}.part"
+        try:
+            with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                self._check(response)
+                with open(temp_path, "wb") as f:
+                    for block in response.iter_content(chunk_size=64 * 1024):
+                        f.write(block)
+            # Only complete files ever appear under the final name
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return path
+
+    def generate(self, prompt, path, model, width, height, steps, seed=None):
+        """Generate one image for prompt and stream it to path"""
+        payload = {"prompt": prompt, "model": model, "width": width, "height": height,
+                   "steps": steps, "n": 1}
+        if seed is not None:
+            payload["seed"] = seed
+        with self._slots:
+            url = self._retry("Image generation", self._generate, payload)
+            return self._retry("Image download", self._download, url, path)
+
+
+_image_client = None
+_image_client_lock = threading.Lock()
+
+def image_client():
+    """Client shared by every job in this process, so the concurrency limit and connection pool are too"""
+    global _image_client
+    with _image_client_lock:
+        if _image_client is None:
+            _image_client = ImageClient()
+    return _image_client
@@ -3,18 +3,51 @@ import time
 import os
 from google import genai
 import dotenv
-from together import Together
 import base64
-import requests
 import random
 import concurrent.futures
+import threading
 from datetime import datetime
-from google.cloud import texttospeech
+from google.cloud import texttospeech, texttospeech_v1beta1
 import assemblyai as aai
-from moviepy.editor import AudioFileClip, ImageClip, concatenate_videoclips, CompositeAudioClip, VideoFileClip, clips_array, CompositeVideoClip, TextClip
+from SrtEdit import WordTimings
+from ImageClient import image_client
 import re
+import html
 import tempfile
 import shutil
+import subprocess
+from PIL import Image, ImageOps
+
+# Models and generation settings. The pipeline's artifact cache keys include these,
+# so changing one invalidates the cached results that depended on it.
+PROMPT_MODEL = "gemini-2.0-flash"
+IMAGE_MODEL = "black-forest-labs/FLUX.1-schnell"
+IMAGE_WIDTH = 768
+IMAGE_HEIGHT = 640
+IMAGE_STEPS = 4
+# Frames are stored render-ready: cropped and resized once to the width of the video, so the
+# renderer only stacks them. 1080x900 keeps the generated 768x640 aspect ratio with an even height
+FRAME_WIDTH = 1080
+FRAME_HEIGHT = 900
+FRAME_QUALITY = int(os.getenv("FRAME_QUALITY", 90))
+# Frames resized at the same time; Pillow releases the GIL while resampling and encoding
+FRAME_WORKERS = int(os.getenv("FRAME_WORKERS", os.cpu_count() or 1))
+TTS_VOICE = 'en-US-Wavenet-A'
+# Frame planning: about one frame per FRAME_SECONDS of video, between MIN_FRAMES and MAX_FRAMES
+FRAME_SECONDS = float(os.getenv("FRAME_SECONDS", 2.5))
+MIN_FRAMES = 4
+MAX_FRAMES = int(os.getenv("MAX_FRAMES", 24))
+# Shorter prompt prefixes say too little to draw
+MIN_PROMPT_CHARS = 50
+# Fewest characters a frame's prompt adds to the one before, so consecutive frames differ
+FRAME_PROMPT_STEP = int(os.getenv("FRAME_PROMPT_STEP", 20))
+TTS_SPEAKING_RATE = 1.3
+
+# How word timings for the captions are obtained:
+#   assemblyai - upload the narration and transcribe it (default)
+#   tts        - take them from SSML mark timepoints returned by Google TTS, fully local
+ALIGNMENT = os.getenv("ALIGNMENT", "assemblyai")
 
 def get_image_promt(story, duration=30):
     story = story.upper()
@@ -40,47 +73,138 @@ Think visually and focus on clear representation. Consider:
 
     client = genai.Client(api_key=os.getenv("GOOGLE_AI"))
     response = client.models.generate_content(
-    model="gemini-2.0-flash", contents=prompt_text
+    model=PROMPT_MODEL, contents=prompt_text
     )
     image_promt = response.text
     print(image_promt, flush=True)
     
     return image_promt
 
+def new_frames_directory(base_dir="frames"):
+    """Create a fresh timestamped directory for one job's frames, audio and captions"""
+    # Use hyphens instead of colons to avoid invalid filename characters
+    current_time = datetime.now().strftime("%m_%d_%H-%M-%S")
+    directory = os.path.join(base_dir, current_time)
+    # Two jobs started within the same second must not share a directory;
+    # makedirs both checks and creates, so only one of them can get each name
+    os.makedirs(base_dir, exist_ok=True)
+    suffix = 1
+    while True:
+        try:
+            os.makedirs(directory)
+            return directory
+        except FileExistsError:
+            directory = os.path.join(base_dir, f"{current_time}_{suffix}")
+            suffix += 1
+
+def normalize_prompt(text):
+    """Lowercase words without punctuation, so prompts that only differ in those compare equal"""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+def plan_frames(image_promt, duration):
+    """
+    The prompts to draw for a video of duration seconds: growing prefixes of the image
+    prompt, cut on word boundaries and spread evenly over it, one per FRAME_SECONDS.
+    Each prefix adds at least FRAME_PROMPT_STEP characters to the one before, so a short
+    prompt gets fewer frames rather than near-identical ones. Below MIN_FRAMES the full
+    prompt is repeated (gen_art draws repeats with another seed). Empty for an empty prompt.
+    """
+    words = image_promt.split()
+    if not normalize_prompt(image_promt):
+        return []
+    target = max(MIN_FRAMES, min(MAX_FRAMES, round(duration / FRAME_SECONDS)))
+    
+    # Word count of the shortest prefix worth drawing
+    first = len(words)
+    length = -1
+    for count, word in enumerate(words, 1):
+        length += len(word) + 1
+        if length >= MIN_PROMPT_CHARS:
+            first = count
+            break
+    # Prompt length of every prefix from there on
+    lengths = {count: len(normalize_prompt(" ".join(words[:count]))) for count in range(first, len(words) + 1)}
+    # No more frames than there are prompts FRAME_PROMPT_STEP apart, spread evenly by length
+    spread = lengths[len(words)] - lengths[first]
+    distinct = min(target, 1 + spread // FRAME_PROMPT_STEP)
+    if distinct > 1:
+        goals = [lengths[first] + i * spread / (distinct - 1) for i in range(distinct)]
+    else:
+        goals = [lengths[len(words)]]
+    counts = sorted({min(lengths, key=lambda count: abs(lengths[count] - goal)) for goal in goals})
+    
+    # Walk back from the full prompt, dropping prefixes too close to the next one kept
+    prompts = []
+    for count in reversed(counts):
+        prompt = " ".join(words[:count])
+        key = normalize_prompt(prompt)
+        if key and (not prompts or len(normalize_prompt(prompts[0])) - len(key) >= FRAME_PROMPT_STEP):
+            prompts.insert(0, prompt)
+    return prompts + prompts[-1:] * (MIN_FRAMES - len(prompts))
+
 def process_snippet(index, prompt_text, set_seed, client, directory):
-    response = client.images.generate(
-        prompt=prompt_text,
-        model="black-forest-labs/FLUX.1-schnell",
-        width=768,
-        height=640,
-        steps=4,
-        n=1,
-        seed=set_seed,
-    )
-    image_url = response.data[0].url
-    image_bytes = requests.get(image_url).content
-    filename = f'{directory}/fram_{index-3}.png'
-    with open(filename, 'wb') as f:
-        f.write(image_bytes)
+    # Zero-padded so the frames sort in order by name
+    filename = f'{directory}/fram_{index:03d}.png'
+    client.generate(prompt_text, filename, model=IMAGE_MODEL, width=IMAGE_WIDTH, height=IMAGE_HEIGHT,
+                    steps=IMAGE_STEPS, seed=set_seed)
     print(f"Saved {filename}", flush=True)
+    return filename
 
+def finish_frame(path):
+    """
+    Crop and resize a generated frame to FRAME_WIDTHxFRAME_HEIGHT and store it as a JPEG
+    next to it, replacing the original. Returns the new path.
+    """
+    with Image.open(path) as image:
+        frame = ImageOps.fit(image.convert("RGB"), (FRAME_WIDTH, FRAME_HEIGHT), Image.LANCZOS)
+    output = os.path.splitext(path)[0] + ".jpg"
+    temp_path = f"{output}.part"
+    frame.save(temp_path, "JPEG", quality=FRAME_QUALITY, optimize=True)
+    # Only complete frames ever appear under the final name
+    os.replace(temp_path, output)
+    if output != path:
+        os.remove(path)
+    return output
 
-def gen_art(image_promt, directory):
-    
-    api_key = os.environ.get("TOGETHER_AI")
+
+def gen_art(image_promt, directory, progress=None, client=None, duration=30):
+    """
+    Generate the frames planned for a video of duration seconds (see plan_frames) into directory.
+    Each frame is passed through finish_frame once it has downloaded.
+    progress(done, total) is called once the number of frames is known and after every finished frame.
+    client defaults to the shared ImageClient, which also bounds how many frames are requested at once.
+    """
     set_seed = random.randint(1, 10000)
-    client = Together(api_key=api_key)
-    snippets = [image_promt[i:i+17] for i in range(0, len(image_promt), 17)]
-    string = ""
-    tasks = []
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        for index, snippet in enumerate(snippets):
-            string += snippet
-            print(f"{index} ||| {set_seed} ||| {string}", flush=True)
-            if index < 3:
-                continue
-            tasks.append(executor.submit(process_snippet, index, string, set_seed, client, directory))
-        for future in concurrent.futures.as_completed(tasks):
+    client = client or image_client()
+    prompts = plan_frames(image_promt, duration)
+    if not prompts:
+        raise ValueError("The image prompt has nothing to draw")
+    finished = []
+    lock = threading.Lock()
+
+    def finish(path):
+        path = finish_frame(path)
+        # Reported as soon as each frame is done, not once all of them are
+        with lock:
+            finished.append(path)
+            if progress:
+                progress(len(finished), len(prompts))
+        return path
+
+    # Frames are finished in their own pool as they arrive, so resizing never holds up a request
+    with concurrent.futures.ThreadPoolExecutor(max_workers=client.max_workers) as executor, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=FRAME_WORKERS) as finisher:
+        downloads = []
+        for index, prompt in enumerate(prompts):
+            # A repeated prompt gets its own seed, or it would come back as the same image
+            seed = set_seed + prompts[:index].count(prompt)
+            print(f"{index} ||| {seed} ||| {prompt}", flush=True)
+            downloads.append(executor.submit(process_snippet, index, prompt, seed, client, directory))
+        if progress:
+            progress(0, len(downloads))
+        tasks = [finisher.submit(finish, future.result())
+                 for future in concurrent.futures.as_completed(downloads)]
+        for future in tasks:
             future.result()
     print("done with images...", flush=True)
     return directory
@@ -91,152 +215,242 @@ def testimages():
     
     return image_folder
 
-def cheapSpeak(input_text, output_path):
-    # Set explicit path to the credentials file
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.abspath("backend/Google.json")
-    
-    client = texttospeech.TextToSpeechClient()
+# Chunks synthesized at the same time, and attempts per chunk before giving up
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", 4))
+TTS_RETRIES = int(os.getenv("TTS_RETRIES", 3))
 
-    # Google TTS has a limit of 5000 bytes per request
-    # Split the text into smaller chunks
-    def split_text(text, max_length=4000):
-        # Split by sentences to keep natural pauses
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        chunks = []
-        current_chunk = ""
-        
-        for sentence in sentences:
-            # If adding this sentence would exceed max_length, start a new chunk
-            if len(current_chunk) + len(sentence) > max_length:
-                if current_chunk:  # Don't add empty chunks
-                    chunks.append(current_chunk)
-                current_chunk = sentence
-            else:
-                if current_chunk:
-                    current_chunk += " " + sentence
-                else:
-                    current_chunk = sentence
-        
-        # Add the last chunk if it's not empty
-        if current_chunk:
-            chunks.append(current_chunk)
-            
-        return chunks
-    
-    # Split the text into chunks
-    chunks = split_text(input_text)
-    print(f"Split text into {len(chunks)} chunks for TTS processing", flush=True)
+_tts_client = None
+_tts_client_lock = threading.Lock()
+
+def tts_client():
+    """One TextToSpeechClient per process - it keeps its gRPC channel open between jobs"""
+    global _tts_client
+    with _tts_client_lock:
+        if _tts_client is None:
+            # Set explicit path to the credentials file
+            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.abspath("backend/Google.json")
+            _tts_client = texttospeech.TextToSpeechClient()
+    return _tts_client
+
+def split_text(text, max_length=4000):
+    """Split text into chunks under the TTS request limit, breaking between sentences"""
+    # Split by sentences to keep natural pauses
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+    chunks = []
+    current_chunk = ""
     
-    # Create temporary directory for audio chunks
-    temp_dir = tempfile.mkdtemp()
+    for sentence in sentences:
+        # If adding this sentence would exceed max_length, start a new chunk
+        if len(current_chunk) + len(sentence) > max_length:
+            if current_chunk:  # Don't add empty chunks
+                chunks.append(current_chunk)
+            current_chunk = sentence
+        else:
+            if current_chunk:
+                current_chunk += " " + sentence
+            else:
+                current_chunk = sentence
     
-    # Process each chunk and save to temporary files
-    temp_files = []
-    for i, chunk in enumerate(chunks):
-        chunk_file = os.path.join(temp_dir, f"chunk_{i}.wav")
-        temp_files.append(chunk_file)
-        
-        # Process this chunk
-        chunk_input = texttospeech.SynthesisInput(text=chunk)
+    # Add the last chunk if it's not empty
+    if current_chunk:
+        chunks.append(current_chunk)
         
-        voice = texttospeech.VoiceSelectionParams(
+    return chunks
+
+def synthesize_chunk(client, index, chunk, marks=False):
+    """
+    Synthesize one chunk, retrying with backoff on errors, and return the response.
+    With marks=True the chunk is SSML and the response carries its <mark> timepoints
+    (only the v1beta1 API returns those, so client must be a v1beta1 client).
+    """
+    tts = texttospeech_v1beta1 if marks else texttospeech
+    
+    request = {
+        "input": tts.SynthesisInput(ssml=chunk) if marks else tts.SynthesisInput(text=chunk),
+        "voice": tts.VoiceSelectionParams(
             language_code="en-US",
-            name='en-US-Wavenet-A'
-        )
-        
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,  # Changed to MP3 for direct output
-            speaking_rate=1.3
-        )
-        
-        try:
-            response = client.synthesize_speech(
-                request={"input": chunk_input, "voice": voice, "audio_config": audio_config}
-            )
-            
-            # If this is the first chunk, write directly to output
-            if i == 0:
-                with open(output_path, "wb") as out:
-                    out.write(response.audio_content)
-                print(f"Created initial audio file", flush=True)
-            else:
-                # For subsequent chunks, create temporary files
-                with open(chunk_file, "wb") as out:
-                    out.write(response.audio_content)
-                print(f"Created chunk {i} audio file", flush=True)
-        except Exception as e:
-            print(f"Error processing chunk {i}: {str(e)}", flush=True)
-            # If a chunk fails, continue with the others
-            continue
+            name=TTS_VOICE
+        ),
+        "audio_config": tts.AudioConfig(
+            audio_encoding=tts.AudioEncoding.MP3,  # Changed to MP3 for direct output
+            speaking_rate=TTS_SPEAKING_RATE
+        ),
+    }
+    if marks:
+        request["enable_time_pointing"] = [tts.SynthesizeSpeechRequest.TimepointType.SSML_MARK]
     
-    # If we have more than one chunk, concatenate using moviepy
-    if len(chunks) > 1:
+    for attempt in range(1, TTS_RETRIES + 1):
         try:
-            # Use the first file as base
-            audio_clips = [AudioFileClip(output_path)]
-            
-            # Add all other chunks
-            for i in range(1, len(chunks)):
-                temp_file = temp_files[i-1]  # -1 because we start from index 1
-                if os.path.exists(temp_file):
-                    audio_clips.append(AudioFileClip(temp_file))
-            
-            # Concatenate all audio clips
-            final_audio = concatenate_audioclips(audio_clips)
-            
-            # Write to output path
-            final_audio.write_audiofile(output_path, fps=44100, nbytes=2, buffersize=2000)
-            
-            # Close all clips to free resources
-            for clip in audio_clips:
-                clip.close()
-                
+            response = client.synthesize_speech(request=request)
+            print(f"Created chunk {index} audio", flush=True)
+            return response
         except Exception as e:
-            print(f"Error concatenating audio: {str(e)}", flush=True)
-            print(f"Using first chunk only for audio", flush=True)
+            print(f"Error processing chunk {index} (attempt {attempt}/{TTS_RETRIES}): {str(e)}", flush=True)
+            if attempt == TTS_RETRIES:
+                raise
+            time.sleep(2 ** (attempt - 1) + random.random())
+
+def cheapSpeak(input_text, output_path, client=None):
+    """
+    Synthesize input_text to an MP3 at output_path.
+    Chunks are sent to Google TTS concurrently (TTS_WORKERS) and joined in order.
+    client defaults to the shared TextToSpeechClient; pass any object with a
+    compatible synthesize_speech() to run against a stub.
+    """
+    client = client or tts_client()
+
+    # Google TTS has a limit of 5000 bytes per request
+    # Split the text into smaller chunks
+    chunks = split_text(input_text)
+    print(f"Split text into {len(chunks)} chunks for TTS processing", flush=True)
     
-    # Clean up temporary files
-    shutil.rmtree(temp_dir)
+    # Synthesize all chunks at once; map() returns them in their original order
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(TTS_WORKERS, len(chunks)))) as executor:
+        responses = list(executor.map(lambda item: synthesize_chunk(client, *item), enumerate(chunks)))
+    audio_chunks = [response.audio_content for response in responses]
     
+    write_audio_chunks(audio_chunks, output_path)
     print(f'Created audio file: {output_path}', flush=True)
     return output_path
 
-def concatenate_audioclips(clips):
-    """Concatenate audio clips together"""
-    durations = [c.duration for c in clips]
-    tt = sum(durations)
+def write_audio_chunks(audio_chunks, output_path):
+    """Write synthesized MP3 chunks to output_path as one file. Returns each chunk's duration in ms"""
+    if len(audio_chunks) == 1:
+        with open(output_path, "wb") as out:
+            out.write(audio_chunks[0])
+        return [audio_duration_ms(output_path)]
     
-    def make_frame(t):
-        d = 0
-        for i, clip in enumerate(clips):
-            if d <= t < d + durations[i]:
-                return clip.make_frame(t - d)
-            d += durations[i]
-        return 0 * clips[0].make_frame(0)
+    # Create temporary directory for audio chunks
+    temp_dir = tempfile.mkdtemp()
+    try:
+        chunk_files = []
+        for i, audio_content in enumerate(audio_chunks):
+            chunk_file = os.path.join(temp_dir, f"chunk_{i}.mp3")
+            with open(chunk_file, "wb") as out:
+                out.write(audio_content)
+            chunk_files.append(chunk_file)
+        concat_mp3(chunk_files, output_path)
+        return [audio_duration_ms(chunk_file) for chunk_file in chunk_files]
+    finally:
+        # Clean up temporary files
+        shutil.rmtree(temp_dir)
+
+def audio_duration_ms(path):
+    output = subprocess.check_output(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", path]
+    )
+    return int(round(float(output.decode('utf-8').strip()) * 1000))
+
+_tts_beta_client = None
+
+def tts_beta_client():
+    """v1beta1 client, the only TTS API version that reports SSML mark timepoints"""
+    global _tts_beta_client
+    tts_client()  # sets up credentials
+    with _tts_client_lock:
+        if _tts_beta_client is None:
+            _tts_beta_client = texttospeech_v1beta1.TextToSpeechClient()
+    return _tts_beta_client
+
+def marked_ssml(words):
+    """SSML with a <mark> before every word and one after the last, named by word index"""
+    parts = [f'<mark name="{i}"/>{html.escape(word, quote=False)}' for i, word in enumerate(words)]
+    return f'<speak>{" ".join(parts)}<mark name="{len(words)}"/></speak>'
+
+def speak_with_timings(input_text, output_path, srt_output_path=None, client=None):
+    """
+    Synthesize input_text like cheapSpeak and return (output_path, WordTimings) with the
+    word timings taken from the TTS mark timepoints instead of transcribing the audio afterwards.
+    Every word starts at its own mark and ends at the next word's mark.
+    The timings are also exported as SRT if srt_output_path is given.
+    """
+    client = client or tts_beta_client()
+    
+    # Every word adds a mark tag, so chunks must be much shorter than the 5000 byte limit
+    chunks = [chunk.split() for chunk in split_text(input_text, max_length=1000)]
+    chunks = [words for words in chunks if words]
+    print(f"Split text into {len(chunks)} chunks for TTS processing with word marks", flush=True)
     
-    result = AudioFileClip(make_frame=make_frame, duration=tt)
-    result.fps = max([clip.fps for clip in clips if hasattr(clip, 'fps')] or [44100])
-    return result
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(TTS_WORKERS, len(chunks)))) as executor:
+        responses = list(executor.map(
+            lambda item: synthesize_chunk(client, item[0], marked_ssml(item[1]), marks=True),
+            enumerate(chunks)
+        ))
+    
+    durations = write_audio_chunks([response.audio_content for response in responses], output_path)
+    
+    timings = WordTimings()
+    offset = 0
+    for words, response, duration in zip(chunks, responses, durations):
+        marks = {int(point.mark_name): int(round(point.time_seconds * 1000)) for point in response.timepoints}
+        for i, word in enumerate(words):
+            # If the service dropped a mark, the word starts where the previous one ended
+            previous_end = timings.ends[-1] if timings else 0
+            start = offset + marks[i] if i in marks else previous_end
+            end = offset + marks.get(i + 1, duration)
+            timings.append(word, start, max(start, end))
+        offset += duration
+    
+    if srt_output_path:
+        timings.to_srt(srt_output_path)
+    print(f'Created audio file: {output_path} with {len(timings)} aligned words', flush=True)
+    return output_path, timings
+
+def concat_mp3(paths, output_path):
+    """
+    Join MP3 files into output_path without decoding or re-encoding them.
+    Uses ffmpeg's concat demuxer with stream copy, which also rewrites the
+    duration header; falls back to appending the raw MP3 frames if ffmpeg fails.
+    """
+    list_file = f"{output_path}.concat.txt"
+    try:
+        with open(list_file, "w") as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        subprocess.run(
+            ["ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", output_path],
+            check=True, capture_output=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"ffmpeg concat failed ({e}), joining MP3 frames directly", flush=True)
+        join_mp3_frames(paths, output_path)
+    finally:
+        if os.path.exists(list_file):
+            os.remove(list_file)
+    return output_path
+
+def id3_size(header):
+    """Length of a leading ID3v2 tag given the first 10 bytes of a file, 0 if there is none"""
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    # Tag size is a 28-bit syncsafe integer, plus the 10 byte header and optional footer
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
 
-def transcribe(audio_path, srt_output_path):
+def join_mp3_frames(paths, output_path):
+    """Append MP3 streams byte for byte, dropping the ID3 tags of all but the first file"""
+    with open(output_path, "wb") as out:
+        for index, path in enumerate(paths):
+            with open(path, "rb") as f:
+                if index > 0:
+                    f.seek(id3_size(f.read(10)))
+                shutil.copyfileobj(f, out)
+
+def transcribe(audio_path, srt_output_path=None):
+    """Word timings of the narration from AssemblyAI; also exported as SRT if srt_output_path is given"""
     aai.settings.api_key = os.getenv('ASSEMBLYAI_API_KEY')
     transcriber = aai.Transcriber()
     transcript = transcriber.transcribe(audio_path)
-    words = transcript.words
     
-    audio = AudioFileClip(audio_path)
-
-    srt_lines = []
-    for i, word in enumerate(words, 1):
-        start_time = f"{(word.start) // 3600000:02}:{((word.start) % 3600000) // 60000:02}:{((word.start) % 60000) // 1000:02},{(word.start) % 1000:03}"
-        end_time = f"{(word.end) // 3600000:02}:{((word.end) % 3600000) // 60000:02}:{((word.end) % 60000) // 1000:02},{(word.end) % 1000:03}"
-
-        srt_lines.append(f"{i}\n{start_time} --> {end_time}\n{word.text}\n")
-
-    srt_content = "\n".join(srt_lines)
-    with open(srt_output_path, "w") as f:
-        f.write(srt_content)        
-    return srt_output_path
+    timings = WordTimings()
+    for word in transcript.words:
+        timings.append(word.text, word.start, word.end)
+    
+    if srt_output_path:
+        timings.to_srt(srt_output_path)
+    return timings
 
 if __name__ == "__main__":
     dotenv.load_dotenv()
@@ -256,22 +470,21 @@ if __name__ == "__main__":
         
         image_promt = get_image_promt(story, duration)
         
-        base_dir = "frames"
-        # Use hyphens instead of colons to avoid invalid filename characters
-        current_time = datetime.now().strftime("%m_%d_%H-%M-%S")
-        directory = os.path.join(base_dir, current_time)
-        
         # Ensure the directory exists before generating images
-        os.makedirs(directory, exist_ok=True)
+        directory = new_frames_directory()
         
         # Generate images synchronously and wait for completion
-        directory = gen_art(image_promt, directory)
+        directory = gen_art(image_promt, directory, duration=duration)
 
-        # Generate audio synchronously
-        audio_file = cheapSpeak(story, f"{directory}/story.mp3")
+        if ALIGNMENT == "tts":
+            # Generate audio and take the word timings from the TTS service
+            audio_file, timings = speak_with_timings(story, f"{directory}/story.mp3", f"{directory}/story.srt")
+        else:
+            # Generate audio synchronously
+            audio_file = cheapSpeak(story, f"{directory}/story.mp3")
 
-        # Transcribe audio synchronously
-        srt_file = transcribe(audio_file, f"{directory}/story.srt")
+            # Transcribe audio synchronously
+            timings = transcribe(audio_file, f"{directory}/story.srt")
 
         # Make sure all files are written to disk before returning
         time.sleep(1)
@@ -0,0 +1,329 @@
+import copy
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a job will not change anymore
+FINISHED_STATUSES = ('completed', 'completed_with_errors', 'failed')
+
+# Jobs owned by another host are only taken over after this many seconds without an update
+STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", 3600))
+
+_process_owner = None
+
+def process_owner():
+    """Identify this process as host:pid:start_time so a reused pid is not mistaken for us"""
+    global _process_owner
+    if _process_owner is None:
+        pid = os.getpid()
+        started = int(psutil.Process(pid).create_time())
+        _process_owner = f"{socket.gethostname()}:{pid}:{started}"
+    return _process_owner
+
+def owner_alive(owner):
+    """Best-effort check whether the process that owns a job is still running"""
+    try:
+        host, pid, started = owner.rsplit(":", 2)
+        pid, started = int(pid), int(started)
+    except (AttributeError, ValueError):
+        return False
+    if host != socket.gethostname():
+        # Can't see other hosts' processes, assume alive and rely on STALE_AFTER
+        return True
+    try:
+        return int(psutil.Process(pid).create_time()) == started
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return False
+
+def seconds_since(timestamp):
+    try:
+        return (datetime.now() - datetime.fromisoformat(timestamp)).total_seconds()
+    except (TypeError, ValueError):
+        return float("inf")
+
+
+class JobStore:
+    """
+    Interface shared by the job store backends.
+    Jobs are plain dicts; id, status, created_at and owner are always present.
+    Every write bumps the job's version so clients can wait for the next change.
+    """
+
+    def __init__(self):
+        self._changed = threading.Condition()
+        self._generation = 0
+
+    def _notify(self):
+        """Wake up wait_for_change() callers in this process"""
+        with self._changed:
+            self._generation += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, job_id, since, timeout=25, poll=1.0):
+        """
+        Block until the job's version is greater than since or timeout runs out,
+        then return the job (None if it doesn't exist).
+        Writes from this process wake us immediately; writes from other server
+        processes are picked up by re-reading the job every poll seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._changed:
+                generation = self._generation
+            job = self.get(job_id)
+            if job is None or job.get("version", 0) > since:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            with self._changed:
+                if self._generation == generation:
+                    self._changed.wait(min(poll, remaining))
+
+    def create(self, job):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def update(self, job_id, **fields):
+        """Merge fields into the job and return the new job, or None if it doesn't exist"""
+        raise NotImplementedError
+
+    def transition(self, job_id, expected, **fields):
+        """Apply fields only if the job's current status is one of expected. Returns the job or None"""
+        raise NotImplementedError
+
+    def list(self, status=None, limit=50, offset=0):
+        """Newest jobs first, optionally filtered by status"""
+        raise NotImplementedError
+
+    def delete(self, job_id):
+        raise NotImplementedError
+
+    def unfinished(self):
+        raise NotImplementedError
+
+    def claim(self, job_id, old_owner, new_owner):
+        """Atomically take over a job from old_owner. Returns True if this caller won"""
+        raise NotImplementedError
+
+    def recover(self, owner=None):
+        """Claim unfinished jobs whose owning process is gone and return them for re-queueing"""
+        owner = owner or process_owner()
+        claimed = []
+        for job in self.unfinished():
+            previous = job.get("owner")
+            if previous == owner:
+                continue
+            if previous and owner_alive(previous) and seconds_since(job.get("updated_at")) < STALE_AFTER:
+                continue
+            if self.claim(job["id"], previous, owner):
+                logger.info(f"Recovered job {job['id']} from {previous or 'no owner'} at stage {job.get('stage') or 'start'}")
+                claimed.append(self.get(job["id"]))
+        return [job for job in claimed if job]
+
+
+class MemoryJobStore(JobStore):
+    """Process-local store, only suitable for a single server process"""
+
+    def __init__(self):
+        super().__init__()
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            job = dict(job, updated_at=datetime.now().isoformat(), version=1)
+            self._jobs[job["id"]] = job
+            job = copy.deepcopy(job)
+        self._notify()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job else None
+
+    def update(self, job_id, **fields):
+        return self.transition(job_id, None, **fields)
+
+    def transition(self, job_id, expected, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (expected is not None and job["status"] not in expected):
+                return None
+            job.update(fields, updated_at=datetime.now().isoformat(), version=job.get("version", 0) + 1)
+            job = copy.deepcopy(job)
+        self._notify()
+        return job
+
+    def list(self, status=None, limit=50, offset=0):
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if status is None or job["status"] == status]
+            jobs.sort(key=lambda job: job["created_at"], reverse=True)
+            return copy.deepcopy(jobs[offset:offset + limit])
+
+    def delete(self, job_id):
+        with self._lock:
+            deleted = self._jobs.pop(job_id, None) is not None
+        self._notify()
+        return deleted
+
+    def unfinished(self):
+        with self._lock:
+            return [copy.deepcopy(job) for job in self._jobs.values() if job["status"] not in FINISHED_STATUSES]
+
+    def claim(self, job_id, old_owner, new_owner):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.get("owner") != old_owner:
+                return False
+            job["owner"] = new_owner
+            job["version"] = job.get("version", 0) + 1
+        self._notify()
+        return True
+
+
+class SqliteJobStore(JobStore):
+    """
+    Jobs persisted in a SQLite database in WAL mode, safe to share between
+    several server processes on the same machine. The full job is kept as JSON;
+    status, created_at, stage, owner and version are mirrored into columns.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    stage TEXT,
+                    owner TEXT,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    data TEXT NOT NULL
+                )""")
+            # Databases created before jobs had versions
+            columns = [row[1] for row in db.execute("PRAGMA table_info(jobs)")]
+            if "version" not in columns:
+                db.execute("ALTER TABLE jobs ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at)")
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # isolation_level=None: we issue BEGIN/COMMIT ourselves
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connection()
+        # Take the write lock up front so read-modify-write is atomic across processes
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    @staticmethod
+    def _write(db, job):
+        db.execute(
+            "INSERT OR REPLACE INTO jobs (id, status, created_at, updated_at, stage, owner, version, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job["id"], job["status"], job["created_at"], job["updated_at"], job.get("stage"), job.get("owner"),
+             job["version"], json.dumps(job)),
+        )
+
+    def create(self, job):
+        job = dict(job, updated_at=datetime.now().isoformat(), version=1)
+        with self._transaction() as db:
+            self._write(db, job)
+        self._notify()
+        return job
+
+    def get(self, job_id):
+        row = self._connection().execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, job_id, **fields):
+        return self.transition(job_id, None, **fields)
+
+    def transition(self, job_id, expected, **fields):
+        with self._transaction() as db:
+            row = db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = json.loads(row[0])
+            if expected is not None and job["status"] not in expected:
+                return None
+            job.update(fields, updated_at=datetime.now().isoformat(), version=job.get("version", 0) + 1)
+            self._write(db, job)
+        self._notify()
+        return job
+
+    def list(self, status=None, limit=50, offset=0):
+        if status is None:
+            rows = self._connection().execute(
+                "SELECT data FROM jobs ORDER BY created_at DESC LIMIT ? OFFSET ?", (limit, offset))
+        else:
+            rows = self._connection().execute(
+                "SELECT data FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ? OFFSET ?", (status, limit, offset))
+        return [json.loads(row[0]) for row in rows]
+
+    def delete(self, job_id):
+        with self._transaction() as db:
+            deleted = db.execute("DELETE FROM jobs WHERE id = ?", (job_id,)).rowcount > 0
+        self._notify()
+        return deleted
+
+    def unfinished(self):
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+        rows = self._connection().execute(
+            f"SELECT data FROM jobs WHERE status NOT IN ({placeholders}) ORDER BY created_at", FINISHED_STATUSES)
+        return [json.loads(row[0]) for row in rows]
+
+    def claim(self, job_id, old_owner, new_owner):
+        with self._transaction() as db:
+            row = db.execute("SELECT data FROM jobs WHERE id = ? AND owner IS ?", (job_id, old_owner)).fetchone()
+            if row is None:
+                return False
+            job = json.loads(row[0])
+            job["owner"] = new_owner
+            job["updated_at"] = datetime.now().isoformat()
+            job["version"] = job.get("version", 0) + 1
+            self._write(db, job)
+        self._notify()
+        return True
+
+
+def create_job_store():
+    """Pick the backend from JOB_STORE (sqlite or memory); SQLite lives at JOB_DB"""
+    backend = os.getenv("JOB_STORE", "sqlite").lower()
+    if backend == "memory":
+        return MemoryJobStore()
+    if backend != "sqlite":
+        raise ValueError(f"Unknown JOB_STORE backend: {backend}")
+    return SqliteJobStore(os.getenv("JOB_DB", "jobs.db"))
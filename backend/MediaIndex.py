@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import subprocess
+import threading
+
+from ResultCache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Resources")
+
+# Resources/<folder> listings and the files they offer
+RESOURCE_FOLDERS = {
+    "Music": (".mp3",),
+    "Rot": (".mp4", ".mov"),
+}
+
+
+def frame_rate(rate):
+    """ffprobe's "30000/1001" style rate as a float, None if unknown"""
+    try:
+        num, den = (float(part) for part in rate.split("/"))
+        return round(num / den, 3) if num and den else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def probe(path, keyframes=False):
+    """
+    Duration, resolution, codecs and frame rate of a media file, from one ffprobe call.
+    With keyframes, also the timestamps of the video keyframes (read from packet flags, nothing is decoded).
+    """
+    output = subprocess.check_output(
+        ["ffprobe", "-v", "error", "-show_entries",
+         "format=duration:stream=codec_type,codec_name,width,height,r_frame_rate",
+         "-of", "json", path]
+    )
+    info = json.loads(output)
+    video = next((s for s in info.get("streams", []) if s.get("codec_type") == "video"), None)
+    audio = next((s for s in info.get("streams", []) if s.get("codec_type") == "audio"), None)
+    meta = {
+        "duration": float(info.get("format", {}).get("duration") or 0),
+        "width": video.get("width") if video else None,
+        "height": video.get("height") if video else None,
+        "codec": (video or audio or {}).get("codec_name"),
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "fps": frame_rate(video.get("r_frame_rate")) if video else None,
+    }
+    if keyframes and video:
+        output = subprocess.check_output(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path]
+        ).decode("utf-8")
+        meta["keyframes"] = sorted(
+            round(float(pts), 3)
+            for pts, flags in (line.split(",", 1) for line in output.splitlines() if "," in line)
+            if "K" in flags and pts not in ("", "N/A")
+        )
+    return meta
+
+
+class MediaIndex:
+    """
+    On-disk index of ffprobe metadata for the static media the renderer reuses
+    (background videos and music). Entries are keyed by absolute path and
+    re-probed when the file's mtime or size changes, so the index stays valid
+    across restarts and file replacements without probing on every render.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, "media_index.json")
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(temp_path, self.path)
+
+    def get(self, path, save=True):
+        """Metadata of path, probing it only if it is new or changed since it was indexed"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = [stat.st_mtime, stat.st_size]
+        with self._lock:
+            entry = self._load().get(path)
+        if entry and entry["signature"] == signature:
+            return entry["meta"]
+
+        meta = probe(path, keyframes=True)
+        logger.debug(f"Indexed {path}: {meta['duration']:.1f}s {meta['width']}x{meta['height']}")
+        with self._lock:
+            self._load()[path] = {"signature": signature, "meta": meta}
+            if save:
+                self._save()
+        return meta
+
+    def duration(self, path):
+        return self.get(path)["duration"]
+
+    def listing(self, folder):
+        """(name, metadata) of every file a Resources/<folder> listing offers"""
+        directory = os.path.join(RESOURCES_DIR, folder)
+        names = sorted(name for name in os.listdir(directory) if name.lower().endswith(RESOURCE_FOLDERS[folder]))
+        return [(name, self.get(os.path.join(directory, name))) for name in names]
+
+    def build(self):
+        """Index every resource file and drop entries for files that are gone"""
+        indexed = 0
+        for folder, extensions in RESOURCE_FOLDERS.items():
+            directory = os.path.join(RESOURCES_DIR, folder)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if not name.lower().endswith(extensions):
+                    continue
+                try:
+                    self.get(os.path.join(directory, name), save=False)
+                    indexed += 1
+                except (OSError, subprocess.CalledProcessError, ValueError) as e:
+                    logger.warning(f"Could not index {name}: {e}")
+        with self._lock:
+            entries = self._load()
+            for path in [path for path in entries if not os.path.exists(path)]:
+                del entries[path]
+            self._save()
+        logger.info(f"Media index ready: {indexed} files")
+
+    def build_in_background(self):
+        thread = threading.Thread(target=self.build, name="media-index", daemon=True)
+        thread.start()
+        return thread
+
+
+# Shared by the renderer and the listing endpoints
+media_index = MediaIndex()
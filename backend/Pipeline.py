@@ -0,0 +1,299 @@
+import concurrent.futures
+import logging
+import os
+import subprocess
+import threading
+from contextlib import nullcontext
+from dataclasses import dataclass
+
+import RotPrompt
+import Images
+from ArtifactStore import ArtifactStore
+from FfmpegEditor import EditVid, get_image_files_from_directory, prepare_media
+from ResultCache import cache_key
+from SrtEdit import WordTimings
+
+logger = logging.getLogger(__name__)
+
+# Stages in execution order. Images and narration only need the script and run side by side.
+# A job's "completed_stages" lists the ones that finished and its "stage" field the last one
+# with every earlier stage finished too, so a job interrupted by a crash resumes right after it.
+STAGE_ORDER = ("script", "images", "narration", "render")
+
+# Seconds the final ffmpeg render may take before the job is marked as timed out
+RENDER_TIMEOUT = int(os.getenv("RENDER_TIMEOUT", 600))
+
+# Render a quick low resolution draft before the full render, unless the job opts out
+PREVIEW = os.getenv("RENDER_PREVIEW", "1") != "0"
+
+# Bump to invalidate every cached stage artifact at once
+ARTIFACT_VERSION = 2
+
+# Stage outputs shared across jobs, keyed by a hash of everything that went into them
+artifacts = ArtifactStore()
+
+
+@dataclass
+class ImageSet:
+    directory: str
+    prompt: str
+    count: int
+
+
+@dataclass
+class Narration:
+    audio_path: str
+    srt_path: str
+    timings: WordTimings
+
+
+@dataclass
+class Render:
+    video_path: str
+    preview_path: str = None
+
+
+def no_slots(name):
+    """Stage slot factory used when the pipeline runs outside the scheduler"""
+    return nullcontext()
+
+
+def cached(kind, key, directory, produce):
+    """Copy the cached kind/key artifact into directory, or run produce() and cache the paths it returns"""
+    paths = artifacts.fetch(kind, key, directory)
+    # Every artifact has at least one file, an empty entry is never a hit
+    if not paths:
+        paths = produce()
+        if paths:
+            artifacts.store(kind, key, paths)
+    return paths
+
+
+def write_script(job, update, stage=no_slots):
+    update(status="writing_script", script_status="processing")
+    with stage("llm"):
+        script = RotPrompt.write_script(job["story"], job["duration"], job["style"],
+                                        use_cache=not job.get("fresh")).strip()
+    logger.debug(f"RotPrompt output: {script}")
+    update(rot_output=script, script_status="completed")
+    return script
+
+
+def make_images(script, duration, directory, update, stage=no_slots):
+    update(images_status="processing")
+
+    def write_prompt():
+        with stage("llm"):
+            prompt = Images.get_image_promt(script, duration)
+        prompt_path = os.path.join(directory, "image_prompt.txt")
+        with open(prompt_path, "w") as f:
+            f.write(prompt)
+        return [prompt_path]
+
+    prompt_key = cache_key("image_prompt", ARTIFACT_VERSION, Images.PROMPT_MODEL, script, duration)
+    with open(cached("image_prompt", prompt_key, directory, write_prompt)[0]) as f:
+        prompt = f.read()
+
+    def progress(done, total):
+        # Reported straight from gen_art as each frame lands on disk
+        update(image_count=done, total_images_expected=total)
+
+    def draw_frames():
+        with stage("images"):
+            Images.gen_art(prompt, directory, progress=progress, duration=duration)
+        frames = get_image_files_from_directory(directory)
+        if not frames:
+            raise RuntimeError("No images were generated")
+        return frames
+
+    frames_key = cache_key("frames", ARTIFACT_VERSION, Images.IMAGE_MODEL, Images.IMAGE_WIDTH,
+                           Images.IMAGE_HEIGHT, Images.IMAGE_STEPS, Images.FRAME_WIDTH, Images.FRAME_HEIGHT,
+                           Images.FRAME_QUALITY, Images.plan_frames(prompt, duration))
+    count = len(cached("frames", frames_key, directory, draw_frames))
+    logger.debug(f"Final image count: {count} images in {directory}")
+    update(images_status="completed", image_count=count, total_images_expected=count,
+           image_prompt=prompt)
+    return ImageSet(directory=directory, prompt=prompt, count=count)
+
+
+def make_narration(script, directory, update, stage=no_slots):
+    update(audio_status="processing")
+    audio_path = os.path.join(directory, "story.mp3")
+    srt_path = os.path.join(directory, "story.srt")
+
+    # Filled in by whichever step produces the timings; stays None on a cache hit
+    produced = {}
+
+    def speak():
+        with stage("tts"):
+            return [Images.cheapSpeak(script, audio_path)]
+
+    def caption():
+        with stage("transcribe"):
+            produced["timings"] = Images.transcribe(audio_path, srt_path)
+        return [srt_path]
+
+    def speak_and_align():
+        with stage("tts"):
+            _, produced["timings"] = Images.speak_with_timings(script, audio_path, srt_path)
+        return [audio_path, srt_path]
+
+    if Images.ALIGNMENT == "tts":
+        # Audio and word timings come out of the same TTS calls, so they are cached together
+        narration_key = cache_key("narration", ARTIFACT_VERSION, "tts-marks", Images.TTS_VOICE,
+                                  Images.TTS_SPEAKING_RATE, script)
+        cached("narration", narration_key, directory, speak_and_align)
+    else:
+        audio_key = cache_key("audio", ARTIFACT_VERSION, Images.TTS_VOICE, Images.TTS_SPEAKING_RATE, script)
+        cached("audio", audio_key, directory, speak)
+        # The captions only depend on the audio, which audio_key fully describes
+        cached("captions", cache_key("captions", ARTIFACT_VERSION, audio_key), directory, caption)
+
+    # Cached captions come back as the SRT export
+    timings = produced.get("timings") or WordTimings.from_srt(srt_path)
+    update(audio_status="completed", audio_path=os.path.abspath(audio_path),
+           srt_path=os.path.abspath(srt_path))
+    return Narration(audio_path=audio_path, srt_path=srt_path, timings=timings)
+
+
+def output_name(job, prefix="output"):
+    """File name of the job's current render; every re-render gets a new one"""
+    renders = job.get("renders", 0)
+    return f"{prefix}.mp4" if not renders else f"{prefix}_{renders}.mp4"
+
+
+def render_preview(job, directory, update, stage=no_slots, timings=None):
+    """Draft render so the captions and pacing can be checked early. Failing here doesn't fail the job"""
+    update(status="processing_video", preview_status="processing")
+    try:
+        # A slot of its own, so other jobs' previews can go before this job's full render
+        with stage("render"):
+            preview_path = EditVid(os.path.abspath(directory), job.get("music"), job.get("video"),
+                                   timeout=RENDER_TIMEOUT, output_name=output_name(job, "preview"),
+                                   timings=timings, caption_style=job.get("caption_style"), preview=True)
+    except Exception:
+        logger.exception(f"Preview render of job {job['id']} failed")
+        preview_path = None
+    if not preview_path:
+        update(preview_status="failed")
+        return None
+    preview_path = os.path.abspath(preview_path)
+    update(preview_status="completed", preview_path=preview_path)
+    return preview_path
+
+
+def render(job, directory, update, stage=no_slots, timings=None):
+    # FfmpegEditor reads the requested duration from here
+    with open(os.path.join(directory, "duration.txt"), "w") as f:
+        f.write(str(job["duration"]))
+
+    preview_path = None
+    if job.get("preview", PREVIEW):
+        preview_path = render_preview(job, directory, update, stage, timings)
+
+    update(status="processing_video", video_status="processing")
+    with stage("render"):
+        video_path = EditVid(os.path.abspath(directory), job.get("music"), job.get("video"), timeout=RENDER_TIMEOUT,
+                             output_name=output_name(job), timings=timings, caption_style=job.get("caption_style"),
+                             render_profile=job.get("render_profile"))
+    if not video_path:
+        raise RuntimeError("ffmpeg failed to render the video")
+    video_path = os.path.abspath(video_path)
+    update(status="completed", video_status="completed", video_path=video_path, stage="render")
+    return Render(video_path=video_path, preview_path=preview_path)
+
+
+def prepare_background(job):
+    """Index the job's background and music while the assets are made, so the render doesn't probe them"""
+    try:
+        prepare_media(job.get("music"), job.get("video"))
+    except Exception:
+        logger.warning(f"Could not prepare background media for job {job['id']}", exc_info=True)
+
+
+def completed_stages(job):
+    """Stages the job has already finished"""
+    done = set(job.get("completed_stages") or ())
+    if job.get("stage") in STAGE_ORDER:
+        done.update(STAGE_ORDER[:STAGE_ORDER.index(job["stage"]) + 1])
+    return done
+
+
+def run_story(job, update, stage=no_slots):
+    """
+    Run every stage of a story job inside this process, skipping the stages
+    the job already finished (before an interruption, or for a re-render).
+    Images and narration both only need the script, so they run in parallel,
+    next to the lookup of the background media; the render waits for all of them.
+    update(**fields) is called whenever the job's public state changes and
+    stage(name) must return a context manager that holds a worker slot for that stage.
+    """
+    done = completed_stages(job)
+    lock = threading.Lock()
+
+    def finished(name):
+        with lock:
+            done.add(name)
+            last = None
+            for stage_name in STAGE_ORDER:
+                if stage_name not in done:
+                    break
+                last = stage_name
+            update(completed_stages=[name for name in STAGE_ORDER if name in done], stage=last)
+
+    def branch(name, fn, *args):
+        result = fn(*args)
+        finished(name)
+        return result
+
+    current = "script_status"
+    try:
+        if "script" not in done:
+            script = branch("script", write_script, job, update, stage)
+        else:
+            script = job["rot_output"]
+
+        current = "images_status"
+        # Reuse the directory of an interrupted attempt so nothing is left behind
+        directory = job.get("directory") or Images.new_frames_directory()
+        os.makedirs(directory, exist_ok=True)
+        update(directory=os.path.abspath(directory))
+
+        branches = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3, thread_name_prefix=f"job-{job['id'][:8]}") as pool:
+            pool.submit(prepare_background, job)
+            if "images" not in done:
+                branches["images_status"] = pool.submit(branch, "images", make_images, script, job["duration"],
+                                                        directory, update, stage)
+            if "narration" not in done:
+                branches["audio_status"] = pool.submit(branch, "narration", make_narration, script, directory,
+                                                       update, stage)
+            if branches:
+                update(status="processing_assets")
+
+        timings = None
+        for current, future in branches.items():
+            result = future.result()
+            if isinstance(result, Narration):
+                timings = result.timings
+
+        current = "video_status"
+        return render(job, directory, update, stage, timings)
+    except subprocess.TimeoutExpired:
+        logger.error(f"Render of job {job['id']} timed out after {RENDER_TIMEOUT} seconds")
+        fail(job, update, f"Video processing timed out after {RENDER_TIMEOUT} seconds", video_status="timeout")
+    except Exception as e:
+        logger.exception(f"Processing error in job {job['id']}")
+        fail(job, update, str(e), **{current: "failed"})
+    return None
+
+
+def fail(job, update, error, **fields):
+    """
+    Mark the job failed. A failed re-render keeps the job's previous status and video,
+    which are still valid, and records what went wrong in render_error instead.
+    """
+    if job.get("renders") and job.get("video_path") and job.get("previous_status") in ("completed", "completed_with_errors"):
+        update(status=job["previous_status"], render_error=error, **fields)
+    else:
+        update(status="failed", error=error, **fields)
@@ -0,0 +1,68 @@
+import os
+from dataclasses import dataclass, asdict
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    """Encoder settings for the final render"""
+    name: str
+    encoder: str = "libx264"
+    preset: str = "veryfast"
+    crf: int = 23
+    pix_fmt: str = "yuv420p"
+    # 0 lets the encoder pick, see RENDER_THREADS
+    threads: int = 0
+    audio_bitrate: str = "128k"
+
+    def video_args(self, threads=None):
+        """Video encoder options; threads is used when neither the profile nor RENDER_THREADS sets a count"""
+        threads = self.threads or RENDER_THREADS or threads or 0
+        return ["-c:v", self.encoder, "-preset", self.preset, "-crf", str(self.crf),
+                "-pix_fmt", self.pix_fmt, "-threads", str(threads)]
+
+    def audio_args(self):
+        return ["-c:a", "aac", "-b:a", self.audio_bitrate]
+
+    def ffmpeg_args(self):
+        """Output options for ffmpeg"""
+        return [*self.video_args(), *self.audio_args(),
+                # Playable in the browser before it has downloaded completely
+                "-movflags", "+faststart"]
+
+
+# Encoder threads per render for profiles that don't set their own; lower it when
+# several renders run at once (STAGE_SLOTS_RENDER) so they don't oversubscribe the CPU
+RENDER_THREADS = int(os.getenv("RENDER_THREADS", 0))
+
+PROFILES = {}
+
+# Profile used when a job doesn't pick one
+DEFAULT_PROFILE = os.getenv("RENDER_PROFILE", "standard")
+
+
+def register_profile(profile):
+    PROFILES[profile.name] = profile
+    return profile
+
+
+def get_profile(name=None):
+    """Look up a profile by name (None for the default); passes RenderProfile instances through"""
+    if isinstance(name, RenderProfile):
+        return name
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown render profile: {name}")
+    return PROFILES[name]
+
+
+def describe_profiles():
+    """All registered profiles as plain dicts, for the API"""
+    return [asdict(profile) for profile in PROFILES.values()]
+
+
+# Quick look at a job, fastest encode at the cost of size and quality
+register_profile(RenderProfile("fast-preview", preset="ultrafast", crf=28, audio_bitrate="96k"))
+# What jobs get by default
+register_profile(RenderProfile("standard"))
+# Keepers: slower encode, smaller file for the same quality
+register_profile(RenderProfile("archive", preset="slow", crf=18, audio_bitrate="192k"))
@@ -2,6 +2,124 @@ import sys
 from google import genai
 import dotenv
 import os
+from ResultCache import ResultCache, cache_key, CACHE_DIR
+
+MODEL = "gemini-2.0-flash"
+
+# Bump whenever the prompt templates in build_prompt change so old cached scripts are not reused
+PROMPT_VERSION = 1
+
+_dictionary_words = None
+_script_cache = None
+
+def load_dictionary():
+    """Read Dictionary.txt once per process"""
+    global _dictionary_words
+    if _dictionary_words is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        dict_path = os.path.join(script_dir, 'Dictionary.txt')
+        with open(dict_path, 'r') as file:
+            _dictionary_words = file.read()
+    return _dictionary_words
+
+def script_cache():
+    """Disk cache of generated scripts, see SCRIPT_CACHE_TTL and SCRIPT_CACHE_SIZE"""
+    global _script_cache
+    if _script_cache is None:
+        _script_cache = ResultCache(
+            os.path.join(CACHE_DIR, "scripts.db"),
+            ttl=int(os.getenv("SCRIPT_CACHE_TTL", 7 * 24 * 3600)),
+            max_entries=int(os.getenv("SCRIPT_CACHE_SIZE", 1000)),
+        )
+    return _script_cache
+
+def build_prompt(story, duration=30, style="brain-rot"):
+    """Build the Gemini prompt for the chosen script style"""
+    dictionary_words = load_dictionary()
+
+    rot = f"""
+     I want you to act as a video script writer who specializes in "brain rot" style content.
+
+    **Task:** Create a short video script for a {duration}-second video from the text I will provide.
+
+    **Video Script Style:**
+    * **Brain Rot:**  Heavily incorporate modern internet memes and slang to the point of being almost nonsensical and hyper-stimulating, but still somewhat understandable and funny.
+    * **Educational:**  Convey a simple educational message or fact (even loosely).
+    * **Optimistic:** The tone should be positive and upbeat.
+    * **Story-Driven:**  Tell a very brief story or convey a simple message with a narrative arc (beginning, middle, end - even if very loose).
+    * **Dictionary Words:**  Use words from the provided dictionary whenever contextually possible, especially "af/asf" (or "asf").
+    brain rot style, no emojis, educational, optimistic, story-driven, using dictionary words, especially \"af/asf\"). Something that can be spoken in {duration} seconds. Return just the story- not title or lables.
+
+    **Dictionary of Words:**
+        {dictionary_words}
+    """
+
+    educational = f"""
+    I want you to act as a video script writer who specializes in educational content.
+
+    **Task:** Create a short video script for a {duration}-second educational video from the text I will provide.
+
+    **Video Script Style:**
+    * **Educational:** Clearly explain concepts in a straightforward, informative way.
+    * **Engaging:** Use an engaging, enthusiastic tone to capture interest.
+    * **Clear:** Use simple language that's easy to understand.
+    * **Concise:** Be brief and to the point - this needs to be spoken in {duration} seconds.
+    * **Structured:** Present information in a logical flow.
+    """
+
+    scary = f"""
+    I want you to act as a video script writer who specializes in creepy, unsettling content.
+
+    **Task:** Create a short video script for a {duration}-second creepy/scary video from the text I will provide. Keep it PG-13 though.
+
+    **Video Script Style:**
+    * **Unsettling:** Create an eerie, uncomfortable atmosphere.
+    * **Suspenseful:** Build tension through your word choices and pacing.
+    * **Mysterious:** Leave some things unexplained to create unease.
+    * **Descriptive:** Use vivid, dark imagery. Nothing to greusome or graphic, should NOT be NSFW.
+    * **Concise:** Be brief and impactful - this needs to be spoken in {duration} seconds.
+    """
+
+    # Default to brain rot style
+    chosen_style = rot
+
+    # Select style based on input
+    if style == "educational":
+        chosen_style = educational
+    elif style == "scary":
+        chosen_style = scary
+
+    prompt_text = f"""
+    {chosen_style}
+
+    **Input Text:**
+    {story}
+
+    **Output Format is just the script. nothing else. no lables. no titles. just return the script. Should only be words, no instructions about clips or sound effects:**
+    """
+
+    return prompt_text
+
+def write_script(story, duration=30, style="brain-rot", use_cache=True):
+    """
+    Turn the user's story into a spoken script in the requested style.
+    Identical requests are answered from the script cache unless use_cache is False,
+    in which case a fresh variation is generated and replaces the cached one.
+    """
+    key = cache_key(story, duration, style, PROMPT_VERSION, MODEL)
+    if use_cache:
+        cached = script_cache().get(key)
+        if cached is not None:
+            return cached
+
+    prompt_text = build_prompt(story, duration, style)
+    client = genai.Client(api_key=os.getenv("GOOGLE_AI"))
+    response = client.models.generate_content(
+    model=MODEL, contents=prompt_text
+    )
+    rot_output = response.text
+    script_cache().put(key, rot_output)
+    return rot_output
 
 if __name__ == "__main__":
     style = "none"
@@ -21,76 +139,7 @@ if __name__ == "__main__":
         if len(sys.argv) > 3:
             style = sys.argv[3]
 
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        dict_path = os.path.join(script_dir, 'Dictionary.txt')
-        with open(dict_path, 'r') as file:
-            dictionary_words = file.read()
-
-        rot = f"""
-         I want you to act as a video script writer who specializes in "brain rot" style content.
-
-        **Task:** Create a short video script for a {duration}-second video from the text I will provide.
-
-        **Video Script Style:**
-        * **Brain Rot:**  Heavily incorporate modern internet memes and slang to the point of being almost nonsensical and hyper-stimulating, but still somewhat understandable and funny.
-        * **Educational:**  Convey a simple educational message or fact (even loosely).
-        * **Optimistic:** The tone should be positive and upbeat.
-        * **Story-Driven:**  Tell a very brief story or convey a simple message with a narrative arc (beginning, middle, end - even if very loose).
-        * **Dictionary Words:**  Use words from the provided dictionary whenever contextually possible, especially "af/asf" (or "asf").
-        brain rot style, no emojis, educational, optimistic, story-driven, using dictionary words, especially \"af/asf\"). Something that can be spoken in {duration} seconds. Return just the story- not title or lables.
-
-        **Dictionary of Words:**
-            {dictionary_words}
-        """
-        
-        educational = f"""
-        I want you to act as a video script writer who specializes in educational content.
-
-        **Task:** Create a short video script for a {duration}-second educational video from the text I will provide.
-
-        **Video Script Style:**
-        * **Educational:** Clearly explain concepts in a straightforward, informative way.
-        * **Engaging:** Use an engaging, enthusiastic tone to capture interest.
-        * **Clear:** Use simple language that's easy to understand.
-        * **Concise:** Be brief and to the point - this needs to be spoken in {duration} seconds.
-        * **Structured:** Present information in a logical flow.
-        """
-        
-        scary = f"""
-        I want you to act as a video script writer who specializes in creepy, unsettling content.
-
-        **Task:** Create a short video script for a {duration}-second creepy/scary video from the text I will provide. Keep it PG-13 though.
-
-        **Video Script Style:**
-        * **Unsettling:** Create an eerie, uncomfortable atmosphere.
-        * **Suspenseful:** Build tension through your word choices and pacing.
-        * **Mysterious:** Leave some things unexplained to create unease.
-        * **Descriptive:** Use vivid, dark imagery. Nothing to greusome or graphic, should NOT be NSFW.
-        * **Concise:** Be brief and impactful - this needs to be spoken in {duration} seconds.
-        """
-        
-        # Default to brain rot style
-        chosen_style = rot
-        
-        # Select style based on input
-        if style == "educational":
-            chosen_style = educational
-        elif style == "scary":
-            chosen_style = scary
-
-        prompt_text = f"""
-        {chosen_style}
-
-        **Input Text:**
-        {story}
-
-        **Output Format is just the script. nothing else. no lables. no titles. just return the script. Should only be words, no instructions about clips or sound effects:**
-        """
-        client = genai.Client(api_key=os.getenv("GOOGLE_AI"))
-        response = client.models.generate_content(
-        model="gemini-2.0-flash", contents=prompt_text
-        )
-        rot_output = response.text
+        rot_output = write_script(story, duration, style)
         print(rot_output)
     else:
-        print("No story provided.")
\ No newline at end of file
+        print("No story provided.")
@@ -0,0 +1,178 @@
+import collections
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages that compete for CPU / API quota. Each one gets its own pool of slots.
+STAGES = ("llm", "images", "tts", "transcribe", "render", "ingest")
+
+# Default number of jobs allowed inside each stage at the same time.
+# Override with STAGE_SLOTS_<STAGE>, e.g. STAGE_SLOTS_RENDER=2
+DEFAULT_STAGE_SLOTS = {
+    "llm": 4,
+    "images": 2,
+    "tts": 4,
+    "transcribe": 4,
+    "render": 1,
+    # Background library transcodes, kept apart from render so they never hold up a job
+    "ingest": 1,
+}
+
+
+class QueueFull(Exception):
+    """Raised when the scheduler queue cannot accept another job"""
+
+
+def env_int(name, default):
+    """Read a positive integer from the environment, falling back to default"""
+    try:
+        value = int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+class FairSlots:
+    """Counting semaphore that hands free slots to waiters strictly in arrival order"""
+
+    def __init__(self, size):
+        self.size = size
+        self._free = size
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+        # The releasing thread hands its slot straight to us, so no re-check is needed
+        waiter.wait()
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self._free += 1
+
+    def in_use(self):
+        with self._lock:
+            return self.size - self._free
+
+    def waiting(self):
+        with self._lock:
+            return len(self._waiters)
+
+
+class Scheduler:
+    """
+    Bounded FIFO job queue drained by a fixed pool of worker threads.
+    Jobs hold a stage slot (see stage()) while doing expensive work so that
+    e.g. only a couple of renders run at once no matter how many jobs are active.
+    """
+
+    def __init__(self, workers=None, max_queue=None, stage_slots=None):
+        self.workers = workers or env_int("JOB_WORKERS", 4)
+        self.max_queue = max_queue or env_int("JOB_QUEUE_SIZE", 32)
+
+        slots = {}
+        for name in STAGES:
+            slots[name] = env_int(f"STAGE_SLOTS_{name.upper()}", DEFAULT_STAGE_SLOTS[name])
+        if stage_slots:
+            slots.update(stage_slots)
+        self._slots = {name: FairSlots(size) for name, size in slots.items()}
+
+        self._pending = collections.deque()
+        self._running = set()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        """Spawn the worker threads (idempotent)"""
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        logger.debug(f"Scheduler started with {self.workers} workers, queue size {self.max_queue}")
+
+    def is_full(self):
+        with self._cond:
+            return len(self._pending) >= self.max_queue
+
+    def submit(self, job_id, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) for job_id and return its 1-based queue position"""
+        with self._cond:
+            if len(self._pending) >= self.max_queue:
+                raise QueueFull(f"Job queue is full ({self.max_queue} jobs waiting)")
+            self._pending.append((job_id, fn, args, kwargs))
+            position = len(self._pending)
+            self._cond.notify()
+        self.start()
+        return position
+
+    def position(self, job_id):
+        """1-based position of a waiting job, 0 if it is running, None if unknown"""
+        with self._cond:
+            if job_id in self._running:
+                return 0
+            for index, entry in enumerate(self._pending):
+                if entry[0] == job_id:
+                    return index + 1
+        return None
+
+    def cancel(self, job_id):
+        """Drop a job that has not started yet. Returns True if it was removed"""
+        with self._cond:
+            for entry in self._pending:
+                if entry[0] == job_id:
+                    self._pending.remove(entry)
+                    return True
+        return False
+
+    @contextmanager
+    def stage(self, name):
+        """Hold one of the worker slots of a pipeline stage for the duration of the block"""
+        slots = self._slots[name]
+        slots.acquire()
+        try:
+            yield
+        finally:
+            slots.release()
+
+    def stats(self):
+        with self._cond:
+            stats = {
+                "queued": len(self._pending),
+                "running": len(self._running),
+                "max_queue": self.max_queue,
+                "workers": self.workers,
+            }
+        stats["stages"] = {
+            name: {"size": slots.size, "in_use": slots.in_use(), "waiting": slots.waiting()}
+            for name, slots in self._slots.items()
+        }
+        return stats
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job_id, fn, args, kwargs = self._pending.popleft()
+                self._running.add(job_id)
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                logger.exception(f"Unhandled error in job {job_id}")
+            finally:
+                with self._cond:
+                    self._running.discard(job_id)
@@ -1,39 +1,128 @@
 #!/usr/bin/env python3
 import os
-import pysrt
-from datetime import timedelta
 import re
+from array import array
 
-def timestamp_to_ass(timestamp):
-    """Convert SRT timestamp to ASS format (h:mm:ss.cc)"""
-    hours = timestamp.hours
-    minutes = timestamp.minutes
-    seconds = timestamp.seconds
-    centiseconds = timestamp.milliseconds // 10
+from CaptionStyle import get_style
+
+SRT_TIME = re.compile(r"(\d+):(\d+):(\d+)[,.](\d+)\s*-->\s*(\d+):(\d+):(\d+)[,.](\d+)")
+
+class WordTimings:
+    """
+    Per-word timing of a narration: the words plus parallel arrays of start and end
+    times in milliseconds. Passed in memory from transcription to caption generation;
+    SRT is only used to persist it.
+    """
+    __slots__ = ("words", "starts", "ends")
+
+    def __init__(self, words=(), starts=(), ends=()):
+        self.words = list(words)
+        self.starts = array('i', starts)
+        self.ends = array('i', ends)
+
+    def append(self, word, start, end):
+        self.words.append(word)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        return zip(self.words, self.starts, self.ends)
+
+    @classmethod
+    def from_srt(cls, srt_path):
+        """Read a per-word SRT file written by to_srt (or any SRT, one cue per word)"""
+        timings = cls()
+        with open(srt_path, encoding='utf-8') as f:
+            blocks = re.split(r"\n\s*\n", f.read().strip())
+        for block in blocks:
+            lines = block.strip().splitlines()
+            for index, line in enumerate(lines):
+                match = SRT_TIME.search(line)
+                if match:
+                    h1, m1, s1, ms1, h2, m2, s2, ms2 = (int(value) for value in match.groups())
+                    text = " ".join(lines[index + 1:]).strip()
+                    timings.append(text,
+                                   ((h1 * 60 + m1) * 60 + s1) * 1000 + ms1,
+                                   ((h2 * 60 + m2) * 60 + s2) * 1000 + ms2)
+                    break
+        return timings
+
+    def to_srt(self, srt_path):
+        """Export as one SRT cue per word"""
+        srt_lines = []
+        for i, (text, start, end) in enumerate(self, 1):
+            srt_lines.append(f"{i}\n{srt_time(start)} --> {srt_time(end)}\n{text}\n")
+        with open(srt_path, "w", encoding='utf-8') as f:
+            f.write("\n".join(srt_lines))
+        return srt_path
+
+def srt_time(ms):
+    """Milliseconds to an SRT timestamp (hh:mm:ss,mmm)"""
+    return f"{ms // 3600000:02}:{(ms % 3600000) // 60000:02}:{(ms % 60000) // 1000:02},{ms % 1000:03}"
+
+def timestamp_to_ass(ms):
+    """Convert milliseconds to ASS format (h:mm:ss.cc)"""
+    hours = ms // 3600000
+    minutes = (ms % 3600000) // 60000
+    seconds = (ms % 60000) // 1000
+    centiseconds = (ms % 1000) // 10
     
     return f"{hours}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
 
-def srt_to_ass(srt_path):
+# How words are revealed inside a caption chunk:
+#   karaoke  - one event per chunk, words revealed by \ko karaoke timing (default)
+#   per_word - one event per word, each repeating the chunk with future words made transparent
+CAPTION_MODES = ("karaoke", "per_word")
+CAPTION_MODE = os.getenv("CAPTION_MODE", "karaoke")
+
+def karaoke_text(chunk, breaks, end_time):
     """
-    Convert an SRT file with per-word timestamps to an ASS file with TikTok-style animated subtitles.
-    Words appear progressively using ASS override tags to control visibility.
+    Whole chunk as a single karaoke line. Each word gets a \ko tag whose duration runs
+    until the next word starts, so it is revealed at its own start time; before that
+    its fill (SecondaryColour, fully transparent) and outline are invisible.
     """
-    # Get the directory and filename from the path
-    directory = os.path.dirname(srt_path)
-    filename = os.path.basename(srt_path).rsplit('.', 1)[0]
-    ass_path = os.path.join(directory, f"{filename}.ass")
-    
-    # Get absolute path to the font file
-    cwd = os.getcwd()
-    font_path = os.path.join(cwd, "backend/Resources/fonts/static/Montserrat-BlackItalic.ttf")
-    font_name = "Montserrat-BlackItalic"
-    
-    # Read the SRT file
-    subs = pysrt.open(srt_path)
-    
-    # Parameters for text wrapping
-    max_chars = 30  # Maximum characters in a chunk
-    char_wrap = 30  # Characters per line
+    chunk_start = chunk[0]['start'] // 10 * 10
+    # Reveal times in centiseconds from the start of the event, rounded once so they don't drift
+    reveal = [(word['start'] - chunk_start + 5) // 10 for word in chunk]
+    # The first word is visible as soon as the event starts
+    reveal[0] = 0
+    reveal.append(max((end_time - chunk_start) // 10, reveal[-1]))
+    
+    parts = []
+    for i, word in enumerate(chunk):
+        separator = "\\N" if i in breaks else " " if i else ""
+        parts.append(f"{separator}{{\\ko{max(reveal[i + 1] - reveal[i], 0)}}}{word['text']}")
+    return "".join(parts)
+
+def srt_to_ass(source, ass_path=None, mode=None, style=None):
+    """
+    Convert per-word timings to an ASS file with TikTok-style animated subtitles.
+    Words appear progressively, see CAPTION_MODES for how, and are laid out by the
+    named caption style (see CaptionStyle).
+    source is either a WordTimings or the path of a per-word SRT file; ass_path
+    defaults to the SRT path with an .ass extension.
+    """
+    mode = mode or CAPTION_MODE
+    style = get_style(style)
+    if mode not in CAPTION_MODES:
+        raise ValueError(f"Unknown caption mode: {mode}")
+
+    if isinstance(source, WordTimings):
+        timings = source
+        if ass_path is None:
+            raise ValueError("ass_path is required when converting in-memory timings")
+        srt_path = "word timings"
+    else:
+        srt_path = source
+        timings = WordTimings.from_srt(srt_path)
+        if ass_path is None:
+            # Get the directory and filename from the path
+            directory = os.path.dirname(srt_path)
+            filename = os.path.basename(srt_path).rsplit('.', 1)[0]
+            ass_path = os.path.join(directory, f"{filename}.ass")
     
     header = f"""[Script Info]
 Title: TikTok Style Subtitles
@@ -41,8 +130,8 @@ ScriptType: v4.00+
 WrapStyle: 0
 ScaledBorderAndShadow: yes
 YCbCr Matrix: None
-PlayResX: 1080
-PlayResY: 1920
+PlayResX: {style.play_res_x}
+PlayResY: {style.play_res_y}
 
 [Aegisub Project Garbage]
 Audio File: ?video
@@ -53,7 +142,7 @@ Video Zoom Percent: 0.500000
 
 [V4+ Styles]
 Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
-Style: Default,{font_name},200,&H0002c2e8,&H000000FF,&H00000000,&H00000000,1,1,0,0,100,100,0,0,1,4,0,5,10,10,200,1
+{style.ass_style()}
 
 [Events]
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
@@ -61,134 +150,58 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 
     # Collect all the words with their timestamps
     words = []
-    for i in range(len(subs)):
+    for text, start, end in timings:
+        if not text.strip():
+            continue
         words.append({
-            'text': subs[i].text.strip(),
-            'start': subs[i].start,
-            'end': subs[i].end
+            'text': text.strip(),
+            'start': start,
+            'end': end
         })
     
-    # Group words into subtitle chunks that fit within max_chars
-    subtitle_chunks = []
-    current_chunk = []
-    current_length = 0
-    
-    for word in words:
-        # If adding this word would exceed max_chars, start a new chunk
-        if current_length + len(word['text']) + (1 if current_length > 0 else 0) > max_chars and current_chunk:
-            subtitle_chunks.append(current_chunk)
-            current_chunk = []
-            current_length = 0
-        
-        current_chunk.append(word)
-        current_length += len(word['text']) + (1 if current_length > 0 else 0)  # +1 for space
-    
-    # Add the last chunk if it's not empty
-    if current_chunk:
-        subtitle_chunks.append(current_chunk)
+    # Group words into chunks and lines by their rendered width in the style's font
+    subtitle_chunks = style.layout([word['text'] for word in words])
     
     lines = []
     
-    # Helper function to calculate visible length (without ASS tags)
-    def visible_length(text):
-        # Remove all ASS tags (like {\\alpha&HFF&}) for length calculation
-        return len(re.sub(r'{\\.*?}', '', text))
-    
     # Process each subtitle chunk
-    for chunk_idx, chunk in enumerate(subtitle_chunks):
-        # Generate the full text for this chunk
-        chunk_text = ' '.join(word['text'] for word in chunk)
+    for chunk_idx, layout in enumerate(subtitle_chunks):
+        chunk = words[layout.start:layout.end]
         
         # Calculate the duration this chunk should be visible
         start_time = chunk[0]['start']
         
         # End time calculation
         if chunk_idx < len(subtitle_chunks) - 1:
-            end_time = subtitle_chunks[chunk_idx + 1][0]['start']
+            end_time = words[subtitle_chunks[chunk_idx + 1].start]['start']
         else:
-            last_word_end = chunk[-1]['end']
-            extended_end = pysrt.SubRipTime(
-                hours=last_word_end.hours,
-                minutes=last_word_end.minutes,
-                seconds=last_word_end.seconds + 2,
-                milliseconds=last_word_end.milliseconds
-            )
-            # Handle overflow
-            if extended_end.seconds >= 60:
-                extended_end.minutes += extended_end.seconds // 60
-                extended_end.seconds = extended_end.seconds % 60
-                if extended_end.minutes >= 60:
-                    extended_end.hours += extended_end.minutes // 60
-                    extended_end.minutes = extended_end.minutes % 60
-            
-            end_time = extended_end
+            # Keep the last chunk on screen for 2 more seconds
+            end_time = chunk[-1]['end'] + 2000
         
         # Get the complete list of words for this chunk
         chunk_words = [word['text'] for word in chunk]
         
+        # Balanced styles always take max_lines lines so the captions don't jump around
+        padding = "\\N" * (style.max_lines - 1 - len(layout.breaks)) if style.balance else ""
+        # Shrink a word that is too wide for a line on its own
+        prefix = f"{{\\fscx{layout.scale}\\fscy{layout.scale}}}" if layout.scale < 100 else ""
+        
+        if mode == "karaoke":
+            text = prefix + karaoke_text(chunk, layout.breaks, end_time) + padding
+            lines.append(f"Dialogue: 0,{timestamp_to_ass(start_time)},{timestamp_to_ass(end_time)},Default,,0,0,0,,{text}")
+            continue
+        
         # Now create a sequence of lines for this chunk, each revealing one more word
         for i in range(len(chunk)):
-            # Create full text with visible and transparent words
-            complete_text = ""
-            for j, word in enumerate(chunk_words):
-                if j < i:  # Previous words are visible
-                    complete_text += word + " "
-                elif j == i:  # Current word is visible
-                    complete_text += word + " "
-                else:  # Future words are transparent
-                    complete_text += f"{{\\alpha&HFF&}}{word}{{\\alpha&H00&}} "
-            
-            complete_text = complete_text.strip()
-            
-            # Wrap text into exactly 2 lines
-            # First, create a non-styled version to find line breaks correctly
-            plain_text = ' '.join(chunk_words)
-            
-            # Break into words without any styling
-            plain_words = plain_text.split()
+            # Previous and current words are visible, future words are transparent
+            styled_words = [
+                word if j <= i else f"{{\\alpha&HFF&}}{word}{{\\alpha&H00&}}"
+                for j, word in enumerate(chunk_words)
+            ]
             
-            # Calculate where to break lines
-            line1_words = []
-            line2_words = []
-            current_line_length = 0
-            
-            for word in plain_words:
-                if current_line_length + len(word) + (1 if current_line_length > 0 else 0) <= char_wrap:
-                    line1_words.append(word)
-                    current_line_length += len(word) + (1 if current_line_length > 0 else 0)
-                else:
-                    line2_words.append(word)
-            
-            # If all words fit on one line, move some to the second line for balance
-            if not line2_words and len(line1_words) > 1:
-                # Move roughly half the words to the second line
-                midpoint = len(line1_words) // 2
-                line2_words = line1_words[midpoint:]
-                line1_words = line1_words[:midpoint]
-                
-            # Now we know where the line breaks should be, apply this to the styled text
-            styled_words = complete_text.split()
-            
-            # Make sure we have enough styled words (should match plain_words)
-            if len(styled_words) == len(plain_words):
-                # Build the two lines with proper styling
-                line1 = ' '.join(styled_words[:len(line1_words)])
-                line2 = ' '.join(styled_words[len(line1_words):]) if styled_words[len(line1_words):] else ""
-                
-                styled_text = f"{line1}\\N{line2}"
-            else:
-                # Fallback - just use the complete text and add a line break
-                middle = len(complete_text) // 2
-                # Find a space near the middle to break at
-                break_pos = complete_text.rfind(' ', 0, middle)
-                if break_pos == -1:
-                    break_pos = complete_text.find(' ', middle)
-                
-                if break_pos != -1:
-                    styled_text = complete_text[:break_pos] + "\\N" + complete_text[break_pos+1:]
-                else:
-                    # No spaces found, force an arbitrary break
-                    styled_text = complete_text[:middle] + "\\N" + complete_text[middle:]
+            # Build the lines with proper styling
+            bounds = (0,) + layout.breaks + (len(chunk),)
+            styled_text = prefix + "\\N".join(' '.join(styled_words[a:b]) for a, b in zip(bounds, bounds[1:])) + padding
             
             # Determine timing for this specific word
             word_start = chunk[i]['start']
@@ -215,12 +228,12 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 def main():
     """
     Command-line interface for the SrtEdit script.
-    Usage: python SrtEdit.py <srt_file_path>
+    Usage: python SrtEdit.py <srt_file_path> [karaoke|per_word]
     """
     import sys
     
-    if len(sys.argv) != 2:
-        print("Usage: python SrtEdit.py <srt_file_path>")
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python SrtEdit.py <srt_file_path> [karaoke|per_word]")
         sys.exit(1)
     
     srt_path = sys.argv[1]
@@ -233,7 +246,7 @@ def main():
         print(f"Error: File must be an SRT file: {srt_path}")
         sys.exit(1)
     
-    ass_path = srt_to_ass(srt_path)
+    ass_path = srt_to_ass(srt_path, mode=sys.argv[2] if len(sys.argv) == 3 else None)
     print(f"ASS subtitle file created: {ass_path}")
 
 if __name__ == "__main__":
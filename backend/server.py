@@ -1,17 +1,24 @@
 import logging
 import os
-from flask import Flask, request, jsonify, send_file, send_from_directory
-from subprocess import Popen, PIPE
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
 import dotenv
-import psutil
 import time
-import subprocess
-import threading
 import uuid
 import json
+import sys
 from datetime import datetime
 
+# Sibling modules are imported by name, also when loaded as backend.server from wsgi.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from Scheduler import Scheduler, QueueFull
+from JobStore import create_job_store, process_owner, FINISHED_STATUSES
+import Pipeline
+import CaptionStyle
+import RenderProfiles
+from MediaIndex import media_index, RESOURCE_FOLDERS
+import BackgroundLibrary
+
 app = Flask(__name__)
 # Allow all origins for CORS to prevent blocking local requests
 CORS(app)  # Updated to allow all origins
@@ -23,8 +30,11 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 dotenv.load_dotenv()
 
-# In-memory store for jobs (in production, use a database)
-jobs = {}
+# Persistent job store (SQLite by default, see JOB_STORE / JOB_DB), shared by all server processes
+store = create_job_store()
+
+# Bounded worker pool that runs the background part of every job
+scheduler = Scheduler()
 
 # Standard API response structure
 def api_response(success, data=None, message=None, error=None, status_code=200):
@@ -42,17 +52,28 @@ def api_response(success, data=None, message=None, error=None, status_code=200):
         
     return jsonify(response), status_code
 
-# Helper function to count images in a directory
-def count_images_in_directory(directory_path):
-    if not directory_path or not os.path.isdir(directory_path):
-        return 0
+def run_job(job_id):
+    """Run the whole story pipeline for a queued job on a scheduler worker"""
+    job = store.get(job_id)
+    if job is None or job["status"] in FINISHED_STATUSES:
+        return
     
-    image_count = 0
-    for file in os.listdir(directory_path):
-        if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-            image_count += 1
+    def update(**fields):
+        store.update(job_id, **fields)
     
-    return image_count
+    result = Pipeline.run_story(job, update, stage=scheduler.stage)
+    if result:
+        logger.info(f"Video processing completed successfully: {result.video_path}")
+
+def recover_jobs():
+    """Re-queue jobs left unfinished by a crashed or restarted server process"""
+    for job in store.recover():
+        store.update(job["id"], status="queued")
+        try:
+            scheduler.submit(job["id"], run_job, job["id"])
+        except QueueFull:
+            logger.error(f"Queue full, could not resume job {job['id']}")
+            store.update(job["id"], status="failed", error="Could not resume job after restart: queue full")
 
 # API Resources
 @app.route('/api/v1/stories', methods=['POST'])
@@ -85,317 +106,70 @@ def create_story():
     if not story_text:
         return api_response(False, error="Story text is required", status_code=400)
     
+    caption_style = data.get('caption_style') or CaptionStyle.DEFAULT_STYLE
+    if caption_style not in CaptionStyle.STYLES:
+        return api_response(False, error=f"Unknown caption style: {caption_style}", status_code=400)
+    render_profile = data.get('render_profile') or RenderProfiles.DEFAULT_PROFILE
+    if render_profile not in RenderProfiles.PROFILES:
+        return api_response(False, error=f"Unknown render profile: {render_profile}", status_code=400)
+    
+    # Reject early instead of piling more work onto an overloaded server
+    if scheduler.is_full():
+        return api_response(False, error="Server is busy, please try again shortly", status_code=429)
+    
     try:
         # Generate a unique job ID
         job_id = str(uuid.uuid4())
         
         # Store job details
-        jobs[job_id] = {
+        job = {
             "id": job_id,
             "story": story_text,
             "duration": duration,  # Store duration in job details
             "style": style,        # Store style in job details
-            "status": "processing",
+            "status": "queued",
             "created_at": datetime.now().isoformat(),
             "rot_output": None,
+            "script_status": "pending",
             "images_status": "pending",
+            "audio_status": "pending",
             "video_status": "pending",
+            "render_error": None,  # Why the last re-render failed; the previous video stays available
             "image_count": 0,  # Initialize image count
             "total_images_expected": 0,  # Will be updated when we know how many to expect
             "music": data.get('music', None),  # Store selected music
-            "video": data.get('video', None)   # Store selected video
+            "video": data.get('video', None),  # Store selected video
+            "caption_style": caption_style,
+            "render_profile": render_profile,
+            "fresh": bool(data.get('fresh', False)),  # Skip the script cache for a new variation
+            "preview": bool(data.get('preview', Pipeline.PREVIEW)),  # Render a quick draft before the full video
+            "preview_status": "pending",
+            "stage": None,  # Last pipeline stage that finished, used to resume after a crash
+            "owner": process_owner()  # Server process responsible for running the job
         }
+        store.create(job)
         
-        # Run RotPrompt.py and capture its output
-        script_path = os.path.join(os.path.dirname(__file__), 'RotPrompt.py')
-        result_rot = subprocess.run(['python', script_path, story_text, str(duration), style], capture_output=True, text=True)
-        
-        if result_rot.stderr:
-            logger.error(f"RotPrompt error: {result_rot.stderr}")
-            jobs[job_id]["status"] = "failed"
-            jobs[job_id]["error"] = result_rot.stderr
-            return api_response(False, error=result_rot.stderr, status_code=500)
-        
-        rot_output = result_rot.stdout.strip()
-        logger.debug(f"RotPrompt output: {rot_output}")
+        # Queue the pipeline on the worker pool
+        try:
+            queue_position = scheduler.submit(job_id, run_job, job_id)
+        except QueueFull as e:
+            store.update(job_id, status="failed", error=str(e))
+            return api_response(False, error=str(e), status_code=429)
         
-        # Update job with rot output
-        jobs[job_id]["rot_output"] = rot_output
-        jobs[job_id]["status"] = "processing_images"
-        jobs[job_id]["images_status"] = "processing"
-        
-        # Define a background function to run Images.py and Editor.py
-        def run_images_editor(job_id, story_param, duration):
-            try:
-                images_path = os.path.join(os.path.dirname(__file__), 'Images.py')
-                jobs[job_id]["images_status"] = "processing"
-                
-                # Pass the duration parameter to Images.py
-                logger.debug(f"Running Images.py with processed '{style}' story and duration: {duration}s")
-                result_images = subprocess.run(
-                    ['python', images_path, story_param, str(duration)], 
-                    capture_output=True, 
-                    text=True
-                )
-                
-                if result_images.stderr:
-                    logger.error(f"Images.py error: {result_images.stderr}")
-                    jobs[job_id]["images_status"] = "failed"
-                    jobs[job_id]["error"] = result_images.stderr
-                    jobs[job_id]["status"] = "failed"
-                    return
-                
-                # Get the last line which should contain only the directory path
-                images_output = result_images.stdout.strip().split('\n')[-1]
-                logger.debug(f"Images.py output directory: {images_output}")
-                
-                # Verify this is a valid directory path, not the full stdout which may contain debugging info
-                if not os.path.isdir(images_output) and "Processing story:" in images_output:
-                    # Extract the actual directory path from the full output
-                    output_lines = result_images.stdout.strip().split('\n')
-                    # Find the line that represents a valid directory path
-                    for line in reversed(output_lines):
-                        if os.path.isdir(line.strip()):
-                            images_output = line.strip()
-                            logger.debug(f"Found valid directory path: {images_output}")
-                            break
-                        elif line.strip().startswith("frames/"):
-                            potential_path = os.path.abspath(line.strip())
-                            if os.path.isdir(potential_path):
-                                images_output = potential_path
-                                logger.debug(f"Found frames directory: {images_output}")
-                                break
-                
-                # Final check to ensure we have a valid directory
-                if not os.path.isdir(images_output):
-                    logger.error(f"Directory not found in Images.py output: {images_output}")
-                    logger.error(f"Full output: {result_images.stdout}")
-                    # Look for any frames directory in the output
-                    for line in result_images.stdout.split('\n'):
-                        if "frames/" in line:
-                            potential_dir = line.strip()
-                            logger.debug(f"Trying potential directory: {potential_dir}")
-                            if os.path.isdir(potential_dir):
-                                images_output = potential_dir
-                                logger.debug(f"Using directory: {images_output}")
-                                break
-                
-                # Count final images in the directory
-                image_count = count_images_in_directory(images_output)
-                jobs[job_id]["image_count"] = image_count
-                jobs[job_id]["total_images_expected"] = image_count  # Now we know how many to expect
-                logger.debug(f"Final image count: {image_count} images in {images_output}")
-                
-                jobs[job_id]["images_status"] = "completed"
-                jobs[job_id]["video_status"] = "processing"
-                jobs[job_id]["status"] = "processing_video"  # Update status to reflect video processing
-                
-                # Store the directory path for later use
-                jobs[job_id]["directory"] = images_output
-                
-                # Ensure the directory exists before proceeding
-                if not os.path.isdir(images_output):
-                    absolute_path = os.path.abspath(images_output)
-                    logger.debug(f"Converting to absolute path: {absolute_path}")
-                    if not os.path.isdir(absolute_path):
-                        logger.error(f"Directory does not exist: {absolute_path}")
-                        jobs[job_id]["video_status"] = "failed"
-                        jobs[job_id]["error"] = f"Directory not found: {absolute_path}"
-                        jobs[job_id]["status"] = "failed"
-                        return
-                    else:
-                        logger.debug(f"Using absolute path for processing: {absolute_path}")
-                        images_output = absolute_path
-                
-                # Allow time for file system operations to complete
-                time.sleep(2)
-                
-                editor_path = os.path.join(os.path.dirname(__file__), 'FfmpegEditor.py')
-                logger.debug(f"Running FfmpegEditor.py with directory: {images_output}")
-                
-                # Assume success until proven otherwise
-                editor_success = False
-                
-                # Use a timeout for the Editor.py process
-                try:
-                    # Run FfmpegEditor.py with a timeout and pass music and video parameters
-                    result_editor = subprocess.run(
-                        [
-                            'python', 
-                            editor_path, 
-                            images_output,
-                            jobs[job_id].get('music', 'none'),  # Pass music parameter
-                            jobs[job_id].get('video', 'none')   # Pass video parameter
-                        ], 
-                        capture_output=True, 
-                        text=True, 
-                        timeout=200  # 10 minute timeout
-                    )
-                    
-                    # Even if stderr is not empty, we may still have a successful video output
-                    # Log errors but continue checking for the output file
-                    if result_editor.stderr:
-                        logger.error(f"FfmpegEditor.py error (might be non-fatal): {result_editor.stderr}")
-                    
-                    editor_output = result_editor.stdout.strip()
-                    logger.debug(f"FfmpegEditor output: {editor_output}")
-                    
-                    # Parse the FfmpegEditor output to find the video path from the last line
-                    output_lines = editor_output.split('\n')
-                    # Look for the last line which should contain the final output path
-                    output_path = None
-                    
-                    # Check for the output file directly first - this is the most reliable method
-                    expected_path = os.path.join(images_output, "output.mp4")
-                    if os.path.exists(expected_path):
-                        output_path = expected_path
-                        logger.debug(f"Found video at expected path: {output_path}")
-                        editor_success = True
-                    else:
-                        # Parse the output for path information
-                        for line in reversed(output_lines):
-                            line = line.strip()
-                            if line and "Video created successfully at:" in line:
-                                # Extract path after the colon and any spaces
-                                path_part = line.split("Video created successfully at:")[-1].strip()
-                                if os.path.exists(path_part) and path_part.endswith(".mp4"):
-                                    output_path = path_part
-                                    logger.debug(f"Found output path from success message: {output_path}")
-                                    editor_success = True
-                                    break
-                            elif line and os.path.exists(line) and line.endswith(".mp4"):
-                                output_path = line
-                                logger.debug(f"Found output path from raw output: {output_path}")
-                                editor_success = True
-                                break
-                        
-                        # If still no path, check for expected output file in the directory
-                        if not output_path:
-                            # Check common output paths
-                            potential_paths = [
-                                os.path.join(images_output, "test_subtitled.mp4"),
-                                os.path.join(images_output, "combined_output.mp4"),
-                                os.path.join(images_output, "ffmpeg_output.mp4"),
-                                os.path.join(os.getcwd(), "combined_output.mp4"),
-                                os.path.join(os.getcwd(), "output.mp4")
-                            ]
-                            
-                            for path in potential_paths:
-                                if os.path.exists(path):
-                                    output_path = path
-                                    logger.debug(f"Found video at standard path: {output_path}")
-                                    editor_success = True
-                                    break
-                        
-                        # Final direct directory scan for any MP4 file
-                        if not output_path and os.path.exists(images_output):
-                            mp4_files = [f for f in os.listdir(images_output) if f.lower().endswith('.mp4')]
-                            if mp4_files:
-                                # Sort by modification time to get the newest one
-                                mp4_files.sort(key=lambda f: os.path.getmtime(os.path.join(images_output, f)), reverse=True)
-                                output_path = os.path.join(images_output, mp4_files[0])
-                                logger.debug(f"Found video by directory scan: {output_path}")
-                                editor_success = True
-                    
-                    if output_path:
-                        jobs[job_id]["video_path"] = output_path
-                        jobs[job_id]["video_status"] = "completed"
-                        jobs[job_id]["status"] = "completed"
-                        logger.info(f"Video processing completed successfully: {output_path}")
-                    else:
-                        logger.error("Cannot find video output file in any expected location")
-                        jobs[job_id]["video_status"] = "missing"
-                        jobs[job_id]["error"] = "Video file not found at expected locations"
-                        jobs[job_id]["status"] = "completed_with_errors"
-                    
-                except subprocess.TimeoutExpired:
-                    logger.error("FfmpegEditor.py process timed out after 10 minutes")
-                    jobs[job_id]["video_status"] = "timeout"
-                    jobs[job_id]["error"] = "Video processing timed out after 10 minutes"
-                    jobs[job_id]["status"] = "failed"
-                    
-                    # Even after timeout, check if video was created
-                    expected_path = os.path.join(images_output, "output.mp4")
-                    if os.path.exists(expected_path):
-                        jobs[job_id]["video_path"] = expected_path
-                        jobs[job_id]["status"] = "completed_with_errors"
-                        logger.info(f"Found video despite timeout: {expected_path}")
-                        
-            except Exception as e:
-                logger.exception("Processing error")
-                jobs[job_id]["status"] = "failed"
-                jobs[job_id]["error"] = str(e)
-                
-                # Final attempt to find a video file even after an exception
-                try:
-                    directory = jobs[job_id].get("directory")
-                    if directory and os.path.exists(directory):
-                        expected_path = os.path.join(directory, "output.mp4")
-                        if os.path.exists(expected_path):
-                            jobs[job_id]["video_path"] = expected_path
-                            jobs[job_id]["status"] = "completed_with_errors"
-                            logger.info(f"Found video despite processing error: {expected_path}")
-                except:
-                    pass
-        
-        # Start background thread with the duration parameter
-        thread = threading.Thread(target=run_images_editor, args=(job_id, rot_output, duration))
-        thread.start()
-
-        # Start a separate thread to monitor image generation progress
-        def monitor_image_progress(job_id):
-            # Set directory immediately so we can start counting ASAP
-            base_dir = "frames"
-            current_time = datetime.now().strftime("%m_%d_%H-%M-%S")
-            temp_dir = os.path.join(base_dir, current_time)
-            os.makedirs(temp_dir, exist_ok=True)
-            jobs[job_id]["directory"] = temp_dir
-            
-            logger.debug(f"Starting image monitoring for job {job_id} in directory {temp_dir}")
-            
-            # Initially count images to make sure we're not starting with zero when there might be existing images
-            initial_count = count_images_in_directory(temp_dir)
-            if initial_count > 0:
-                jobs[job_id]["image_count"] = initial_count
-                logger.debug(f"Initial image count for job {job_id}: {initial_count} images")
-            
-            # Monitor image count while images are being generated
-            while jobs[job_id].get("images_status") == "processing" or jobs[job_id].get("images_status") == "pending":
-                directory = jobs[job_id].get("directory")
-                if directory and os.path.isdir(directory):
-                    # Count all PNG, JPG, JPEG files in the directory using our helper function
-                    current_count = count_images_in_directory(directory)
-                    
-                    # Only update if count has changed to avoid unnecessary updates
-                    if current_count != jobs[job_id].get("image_count", 0):
-                        jobs[job_id]["image_count"] = current_count
-                        logger.debug(f"Updated image count for job {job_id}: {current_count} images")
-                        
-                time.sleep(0.5)  # Check frequently (every 0.5 seconds)
-                
-            # Final check after processing completes
-            directory = jobs[job_id].get("directory")
-            if directory and os.path.isdir(directory):
-                final_count = count_images_in_directory(directory)
-                jobs[job_id]["image_count"] = final_count
-                logger.debug(f"Final image count for job {job_id}: {final_count} images")
-        
-        image_monitor_thread = threading.Thread(target=monitor_image_progress, args=(job_id,))
-        image_monitor_thread.daemon = True  # Make this a daemon thread so it doesn't block process exit
-        image_monitor_thread.start()
-        
-        # Return the RotPrompt output immediately with job ID
+        # Return the job ID immediately, the script shows up in the job status once written
         return api_response(
             True, 
             data={
                 "job_id": job_id,
-                "rot_output": rot_output,
-                "status": jobs[job_id]["status"],
+                "rot_output": None,
+                "status": job["status"],
+                "queue_position": queue_position,
                 "duration": duration,  # Return the selected duration
                 "style": style,        # Return the selected style
                 "image_count": 0  # Initial image count
             },
-            message=f"Story processing started - audio will be generated from the '{style}' version of the story"
+            message=f"Story processing started - audio will be generated from the '{style}' version of the story",
+            status_code=202
         )
     
     except Exception as e:
@@ -403,66 +177,216 @@ def create_story():
         return api_response(False, error=str(e), status_code=500)
 
 
+def job_payload(job):
+    """Job as returned by the API, with the live queue position of waiting jobs"""
+    if job["status"] == "queued":
+        job = dict(job, queue_position=scheduler.position(job["id"]))
+    return job
+
+
+# Longest a long-poll request or an event stream stays open
+LONG_POLL_TIMEOUT = 25
+# How long EventSource waits before reopening a stream that ended, in milliseconds
+EVENTS_RETRY_MS = 500
+
 @app.route('/api/v1/stories/<job_id>', methods=['GET'])
 def get_story_status(job_id):
-    """Get the status of a story processing job"""
-    if job_id not in jobs:
+    """
+    Get the status of a story processing job.
+    With ?since=<version> the request waits until the job changes past that version (long-poll).
+    """
+    since = request.args.get('since')
+    if since is None:
+        job = store.get(job_id)
+    else:
+        try:
+            since = int(since)
+        except ValueError:
+            return api_response(False, error="since must be an integer version", status_code=400)
+        job = store.wait_for_change(job_id, since, timeout=LONG_POLL_TIMEOUT)
+    
+    if job is None:
         return api_response(False, error="Job not found", status_code=404)
     
-    job = jobs[job_id]
+    return api_response(True, data=job_payload(job))
+
+
+@app.route('/api/v1/stories/<job_id>/events', methods=['GET'])
+def story_events(job_id):
+    """
+    Stream job updates as Server-Sent Events for up to LONG_POLL_TIMEOUT seconds.
+    EventSource reconnects by itself with Last-Event-ID, so clients still see every update until the job finishes.
+    """
+    job = store.get(job_id)
+    if job is None:
+        return api_response(False, error="Job not found", status_code=404)
     
-    # Check the current image count in the directory before sending the status
-    directory = job.get("directory")
-    if directory and os.path.isdir(directory):
-        current_image_count = count_images_in_directory(directory)
-        # Only update if count has changed to avoid unnecessary updates
-        if current_image_count != job.get("image_count", 0):
-            job["image_count"] = current_image_count
-            logger.debug(f"Updated image count for job {job_id} in status check: {current_image_count} images")
+    # EventSource sends the last version it saw when it reconnects
+    try:
+        since = int(request.headers.get('Last-Event-ID', request.args.get('since', 0)))
+    except ValueError:
+        since = 0
     
-    return api_response(True, data=job)
+    def stream(since, job):
+        # Tells EventSource how soon to reconnect once this window ends
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        if job["status"] in FINISHED_STATUSES and job["version"] <= since:
+            # Reconnected after the last update, send the final state again so the client stops
+            yield f"id: {job['version']}\nevent: status\ndata: {json.dumps(job_payload(job))}\n\n"
+            return
+        # One long-poll window per connection, so a stream never holds a worker for a whole job;
+        # the reconnect picks up where it left off through Last-Event-ID
+        deadline = time.monotonic() + LONG_POLL_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            job = store.wait_for_change(job_id, since, timeout=remaining)
+            if job is None:
+                yield "event: deleted\ndata: {}\n\n"
+                return
+            if job["version"] <= since:
+                break
+            since = job["version"]
+            yield f"id: {since}\nevent: status\ndata: {json.dumps(job_payload(job))}\n\n"
+            if job["status"] in FINISHED_STATUSES:
+                return
+        # An id without data updates the client's Last-Event-ID even when nothing changed
+        yield f"id: {since}\n\n"
+    
+    return Response(
+        stream_with_context(stream(since, job)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 @app.route('/api/v1/stories', methods=['GET'])
 def list_stories():
-    """List all story processing jobs"""
-    return api_response(True, data=list(jobs.values()))
+    """List story processing jobs, newest first. Supports ?status=, ?limit= and ?offset="""
+    status = request.args.get('status')
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return api_response(False, error="limit and offset must be integers", status_code=400)
+    return api_response(True, data=store.list(status=status, limit=limit, offset=offset))
+
+
+def resource_file(folder, name, extensions):
+    """True if name is one of the files offered by a Resources/<folder> listing"""
+    if not name or name == 'none':
+        return True
+    if os.path.basename(name) != name or not name.lower().endswith(extensions):
+        return False
+    return os.path.isfile(os.path.join(os.path.dirname(__file__), 'Resources', folder, name))
+
+
+@app.route('/api/v1/stories/<job_id>/render', methods=['POST'])
+def rerender_story(job_id):
+    """Render an existing job again with different music/background/caption style, reusing its script, images and audio"""
+    data = request.get_json(silent=True) or {}
+    job = store.get(job_id)
+    if job is None:
+        return api_response(False, error="Job not found", status_code=404)
+    
+    # Only the ffmpeg step is re-run, so the assets must already exist
+    if job.get("stage") not in ('narration', 'render'):
+        return api_response(False, error="Job has no assets to render yet", status_code=409)
+    
+    music = data.get('music', job.get('music'))
+    video = data.get('video', job.get('video'))
+    if not resource_file('Music', music, ('.mp3',)):
+        return api_response(False, error=f"Unknown music: {music}", status_code=400)
+    if not resource_file('Rot', video, ('.mp4', '.mov')):
+        return api_response(False, error=f"Unknown background video: {video}", status_code=400)
+    caption_style = data.get('caption_style', job.get('caption_style'))
+    if caption_style and caption_style not in CaptionStyle.STYLES:
+        return api_response(False, error=f"Unknown caption style: {caption_style}", status_code=400)
+    render_profile = data.get('render_profile', job.get('render_profile'))
+    if render_profile and render_profile not in RenderProfiles.PROFILES:
+        return api_response(False, error=f"Unknown render profile: {render_profile}", status_code=400)
+    
+    if scheduler.is_full():
+        return api_response(False, error="Server is busy, please try again shortly", status_code=429)
+    
+    # What the job goes back to if the render can't be queued
+    previous = {field: job.get(field) for field in
+                ("status", "video_status", "preview_status", "preview_path", "error", "music", "video",
+                 "caption_style", "render_profile", "renders", "previous_status", "render_error")}
+    
+    # Atomic so two concurrent requests (or a still-running job) can't both start a render
+    job = store.transition(
+        job_id, FINISHED_STATUSES,
+        status="queued", video_status="pending", preview_status="pending", preview_path=None, error=None,
+        previous_status=job["status"], render_error=None, music=music, video=video,
+        caption_style=caption_style, render_profile=render_profile, renders=job.get("renders", 0) + 1,
+        owner=process_owner()
+    )
+    if job is None:
+        return api_response(False, error="Job is still being processed", status_code=409)
+    
+    try:
+        queue_position = scheduler.submit(job_id, run_job, job_id)
+    except QueueFull as e:
+        # Nothing was rendered, the job and its video stay as they were
+        store.update(job_id, **previous)
+        return api_response(False, error=str(e), status_code=429)
+    
+    return api_response(
+        True,
+        data={
+            "job_id": job_id,
+            "status": job["status"],
+            "queue_position": queue_position,
+            "music": music,
+            "video": video,
+            "caption_style": caption_style,
+            "render_profile": render_profile
+        },
+        message="Re-render started",
+        status_code=202
+    )
 
 
 @app.route('/api/v1/stories/<job_id>', methods=['DELETE'])
 def delete_story(job_id):
     """Delete a story processing job"""
-    if job_id not in jobs:
+    scheduler.cancel(job_id)
+    if not store.delete(job_id):
         return api_response(False, error="Job not found", status_code=404)
-    
-    del jobs[job_id]
+
     return api_response(True, message="Job deleted successfully")
 
 
 @app.route('/api/v1/videos/<job_id>', methods=['GET'])
 def get_video(job_id):
     """Get the generated video for a story"""
-    if job_id not in jobs:
+    job = store.get(job_id)
+    if job is None:
         return api_response(False, error="Job not found", status_code=404)
     
-    job = jobs[job_id]
+    video_path = job.get("video_path")
     if job["status"] != "completed" and job["status"] != "completed_with_errors":
+        # While a re-render waits or runs, the previous video is still there and still valid
+        if (job.get("previous_status") in ("completed", "completed_with_errors")
+                and video_path and os.path.exists(video_path)):
+            return send_file(video_path, mimetype='video/mp4')
         return api_response(False, error="Video not ready yet", status_code=400)
     
-    video_path = job.get("video_path")
     if not video_path or not os.path.exists(video_path):
         # Try to construct the path from the directory
         directory = job.get("directory")
         if directory:
             # Check all mp4 files in the directory
             if os.path.exists(directory):
-                mp4_files = [f for f in os.listdir(directory) if f.endswith('.mp4')]
+                mp4_files = [f for f in os.listdir(directory) if f.endswith('.mp4') and not f.startswith('preview')]
                 if mp4_files:
                     # Sort by modification time to get the newest one
                     mp4_files.sort(key=lambda f: os.path.getmtime(os.path.join(directory, f)), reverse=True)
                     video_path = os.path.join(directory, mp4_files[0])
                     logger.debug(f"Using newest video file: {video_path}")
-                    job["video_path"] = video_path
+                    store.update(job_id, video_path=video_path)
     
     if video_path and os.path.exists(video_path):
         logger.debug(f"Sending video file: {video_path}")
@@ -473,6 +397,23 @@ def get_video(job_id):
         return api_response(False, error=f"Video file not found. Please check server logs.", status_code=404)
 
 
+@app.route('/api/v1/videos/<job_id>/preview', methods=['GET'])
+def get_preview(job_id):
+    """Get the low resolution draft of a story, available before the full render finishes"""
+    job = store.get(job_id)
+    if job is None:
+        return api_response(False, error="Job not found", status_code=404)
+    
+    if job.get("preview_status") != "completed":
+        return api_response(False, error="Preview not ready yet", status_code=400)
+    
+    preview_path = job.get("preview_path")
+    if not preview_path or not os.path.exists(preview_path):
+        logger.error(f"Preview file not found. Tried path: {preview_path}")
+        return api_response(False, error="Preview file not found", status_code=404)
+    return send_file(preview_path, mimetype='video/mp4')
+
+
 # For backward compatibility
 @app.route('/run-script', methods=['POST'])
 def run_script():
@@ -492,12 +433,8 @@ def run_script():
 def check_status():
     """Legacy endpoint for backward compatibility"""
     try:
-        # Check if Images.py is running
-        images_running = False
-        for proc in psutil.process_iter(['name', 'cmdline']):
-            if proc.info['cmdline'] and 'Images.py' in ' '.join(proc.info['cmdline']):
-                images_running = True
-                break
+        # Images are generated in-process now, so look at the jobs instead of the process table
+        images_running = any(job.get('images_status') == 'processing' for job in store.unfinished())
         
         return jsonify({
             'images_running': images_running
@@ -522,13 +459,19 @@ def serve_static(path):
     return send_from_directory(frontend_dir, path)
 
 
+def resource_listing(folder):
+    """File names in Resources/<folder>, or with ?details=true their indexed media metadata too"""
+    if request.args.get('details', '').lower() == 'true':
+        entries = media_index.listing(folder)
+        return [dict(meta, name=name, keyframes=len(meta.get("keyframes", []))) for name, meta in entries]
+    directory = os.path.join(os.path.dirname(__file__), 'Resources', folder)
+    return [f for f in os.listdir(directory) if f.lower().endswith(RESOURCE_FOLDERS[folder])]
+
 # New endpoint to list available background music files
 @app.route('/api/v1/music', methods=['GET'])
 def list_music():
     try:
-        music_dir = os.path.join(os.path.dirname(__file__), 'Resources', 'Music')
-        music_files = [f for f in os.listdir(music_dir) if f.lower().endswith('.mp3')]
-        return api_response(True, data=music_files)
+        return api_response(True, data=resource_listing('Music'))
     except Exception as e:
         return api_response(False, error=str(e), status_code=500)
 
@@ -536,12 +479,30 @@ def list_music():
 @app.route('/api/v1/videos/backgrounds', methods=['GET'])
 def list_background_videos():
     try:
-        video_dir = os.path.join(os.path.dirname(__file__), 'Resources', 'Rot')
-        video_files = [f for f in os.listdir(video_dir) if f.lower().endswith(('.mp4', '.mov'))]
-        return api_response(True, data=video_files)
+        return api_response(True, data=resource_listing('Rot'))
     except Exception as e:
         return api_response(False, error=str(e), status_code=500)
 
+# List the caption styles a story can be rendered with
+@app.route('/api/v1/caption-styles', methods=['GET'])
+def list_caption_styles():
+    return api_response(True, data={"default": CaptionStyle.DEFAULT_STYLE, "styles": CaptionStyle.describe_styles()})
+
+# List the encoder profiles a story can be rendered with
+@app.route('/api/v1/render-profiles', methods=['GET'])
+def list_render_profiles():
+    return api_response(True, data={"default": RenderProfiles.DEFAULT_PROFILE, "profiles": RenderProfiles.describe_profiles()})
+
+# Pick up jobs that a previous server process didn't get to finish
+# (skipped in the watcher process of the debug reloader, which never serves requests)
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    recover_jobs()
+    # Probe background videos and music up front instead of during the first renders
+    media_index.build_in_background()
+    if BackgroundLibrary.INGEST:
+        # Transcodes take the ingest slot, and only one process on the host ingests each file
+        BackgroundLibrary.ingest_in_background(scheduler.stage)
+
 if __name__ == '__main__':
     dotenv.load_dotenv()  # ensure env is loaded
     # Updated to bind to 0.0.0.0 so external devices can access the server
@@ -158,8 +158,10 @@ function submitStory() {
         console.log('Server response:', data);
         currentJobId = data.data.job_id;
         
-        // Display ROT output
-        displayRotOutput(data.data.rot_output);
+        // The script is written in the background - it arrives with the status updates
+        if (data.data.rot_output) {
+            displayRotOutput(data.data.rot_output);
+        }
         
         // Begin polling for status if processing continues
         if (data.data.status !== 'completed') {
@@ -196,69 +198,146 @@ function startStatusPolling() {
         return;
     }
     
-    // Keep track of how long we've been waiting
-    let pollCount = 0;
-    const maxPolls = 60; // About 2 minutes at 2-second intervals
+    const jobId = currentJobId;
     let previousImageCount = 0; // Track the previous image count
+    let rotOutputShown = false; // Show the script once it has been written
+    let previewShown = false; // Show the draft render while the full one is encoded
+    let videoStartedAt = null; // When the video editing step started
+    let finished = false;
+    
+    // Give more feedback while the video is being edited - local timer, no requests
+    const videoTimer = setInterval(() => {
+        if (videoStartedAt === null) {
+            return;
+        }
+        const seconds = Math.floor((Date.now() - videoStartedAt) / 1000);
+        if (seconds > 30 && seconds % 5 === 0) {
+            loaderText.innerText = `Still processing video... (${Math.floor(seconds/60)} minute${seconds/60 >= 2 ? 's' : ''})`;
+        }
+    }, 1000);
     
-    const pollInterval = setInterval(() => {
-        fetch(`http://localhost:8000/api/v1/stories/${currentJobId}`)
+    // Handle one job update, returns true once the job has finished
+    function handleUpdate(jobData) {
+        console.log('Status update:', jobData);
+        
+        // Only log if the count has actually changed to avoid cluttering the console
+        const currentImageCount = jobData.image_count || 0;
+        if (currentImageCount !== previousImageCount) {
+            console.log(`Image count updated: ${currentImageCount}`);
+            previousImageCount = currentImageCount;
+        }
+        
+        if (!rotOutputShown && jobData.rot_output) {
+            displayRotOutput(jobData.rot_output);
+            rotOutputShown = true;
+        }
+        
+        updateStatusDisplay(jobData, loaderText);
+        
+        if (!previewShown && jobData.preview_status === 'completed' && jobData.status === 'processing_video') {
+            showVideoResult(jobId, true);
+            previewShown = true;
+        }
+        
+        if (jobData.status === 'processing_video') {
+            if (videoStartedAt === null) {
+                videoStartedAt = Date.now();
+            }
+        } else {
+            videoStartedAt = null;
+        }
+        
+        // If processing is complete or failed, stop listening
+        if (jobData.status === 'completed' || 
+            jobData.status === 'completed_with_errors' || 
+            jobData.status === 'failed') {
+            finished = true;
+            clearInterval(videoTimer);
+            
+            if (jobData.status === 'completed' || jobData.status === 'completed_with_errors') {
+                showVideoResult(jobId);
+            } else {
+                // Show failure message and enable the submit button again
+                showLoading(false);
+            }
+        }
+        return finished;
+    }
+    
+    function stopWithError(error) {
+        console.error('Status check error:', error);
+        clearInterval(videoTimer);
+        showLoading(false);
+    }
+    
+    // Fallback: long-poll, the server answers as soon as the job version moves past `since`
+    function longPoll(since) {
+        if (finished) {
+            return;
+        }
+        fetch(`http://localhost:8000/api/v1/stories/${jobId}?since=${since}`)
             .then(handleApiResponse)
             .then(data => {
-                console.log('Status update:', data);
-                
-                // Check if image count has changed
-                const currentImageCount = data.data.image_count || 0;
-                
-                // Only log if the count has actually changed to avoid cluttering the console
-                if (currentImageCount !== previousImageCount) {
-                    console.log(`Image count updated: ${currentImageCount}`);
-                    previousImageCount = currentImageCount;
-                }
-                
-                updateStatusDisplay(data.data, loaderText);
-                
-                // If processing is complete or failed, stop polling
-                if (data.data.status === 'completed' || 
-                    data.data.status === 'completed_with_errors' || 
-                    data.data.status === 'failed') {
-                    clearInterval(pollInterval);
-                    
-                    if (data.data.status === 'completed' || data.data.status === 'completed_with_errors') {
-                        showVideoResult(currentJobId);
-                    } else {
-                        // Show failure message and enable the submit button again
-                        showLoading(false);
-                    }
-                }
-                
-                // For video processing, give more feedback about waiting
-                if (data.data.status === 'processing_video') {
-                    pollCount++;
-                    if (pollCount > 15 && pollCount % 5 === 0) { // After 30 seconds, give updates
-                        loaderText.innerText = `Still processing video... (${Math.floor(pollCount/60)} minute${pollCount/60 >= 2 ? 's' : ''})`;
-                    }
+                if (!handleUpdate(data.data)) {
+                    longPoll(data.data.version || since);
                 }
             })
-            .catch(error => {
-                console.error('Status check error:', error);
-                clearInterval(pollInterval);
-                showLoading(false);
-            });
-    }, 1000); // Poll every 1 second to get more responsive image count updates
+            .catch(stopWithError);
+    }
+    
+    if (!window.EventSource) {
+        longPoll(0);
+        return;
+    }
+    
+    // Server-Sent Events: the server pushes every stage transition and image count
+    let lastVersion = 0;
+    const events = new EventSource(`http://localhost:8000/api/v1/stories/${jobId}/events`);
+    events.addEventListener('status', event => {
+        const jobData = JSON.parse(event.data);
+        lastVersion = jobData.version || lastVersion;
+        if (handleUpdate(jobData)) {
+            events.close();
+        }
+    });
+    events.addEventListener('deleted', () => {
+        events.close();
+        stopWithError(new Error('Job was deleted'));
+    });
+    events.onerror = () => {
+        // The stream closes normally once the job finishes
+        if (finished) {
+            events.close();
+            return;
+        }
+        // EventSource gives up on HTTP errors, switch to long-polling then
+        if (events.readyState === EventSource.CLOSED) {
+            longPoll(lastVersion);
+        }
+    };
 }
 
 function updateStatusDisplay(jobData, loaderElement) {
     switch (jobData.status) {
-        case 'processing_images':
-            // Display image count if available
-            if (jobData.hasOwnProperty('image_count')) {
-                const expectedImages = jobData.total_images_expected || "multiple";
-                loaderElement.innerText = `Generating images... ${jobData.image_count} ${jobData.image_count === 1 ? 'image' : 'images'} created${jobData.total_images_expected ? ' of ' + expectedImages : ''}`;
+        case 'queued':
+            if (jobData.queue_position) {
+                loaderElement.innerText = `Waiting in queue... position ${jobData.queue_position}`;
             } else {
-                loaderElement.innerText = "Generating images...";
+                loaderElement.innerText = "Waiting in queue...";
             }
             break;
+        case 'writing_script':
+            loaderElement.innerText = "Writing script...";
+            break;
+        case 'processing_assets': {
+            // Images, voice-over and captions are made at the same time
+            const images = jobData.images_status === 'completed'
+                ? `${jobData.image_count} images created`
+                : `Generating images... ${jobData.image_count || 0}${jobData.total_images_expected ? ' of ' + jobData.total_images_expected : ''} created`;
+            const audio = jobData.audio_status === 'completed' ? 'voice-over ready' : 'generating voice-over and captions';
+            loaderElement.innerText = `${images}, ${audio}...`;
+            break;
+        }
         case 'processing_video':
             if (jobData.hasOwnProperty('image_count')) {
                 loaderElement.innerText = `Editing video with ${jobData.image_count} images... (this may take a few minutes)`;
@@ -298,7 +377,7 @@ function updateStatusDisplay(jobData, loaderElement) {
     }
 }
 
-function showVideoResult(jobId) {
+function showVideoResult(jobId, preview = false) {
     // Get the side panel element
     const sidePanel = document.querySelector('.side-panel');
     
@@ -327,15 +406,15 @@ function showVideoResult(jobId) {
         readyMessage.style.display = 'none';
     }
     
-    // Show loading state
+    // Show loading state, a preview plays while the full video is still being processed
     const loadingText = document.querySelector('.loader-text');
-    if (loadingText) {
+    if (loadingText && !preview) {
         loadingText.innerText = 'Loading video, please wait...';
     }
     
     // Set up error handling for the video
     videoElement.onerror = function() {
-        if (loadingText) {
+        if (loadingText && !preview) {
             loadingText.innerText = 'Error loading video. Please try again later.';
             loadingText.style.color = 'red';
         }
@@ -343,6 +422,15 @@ function showVideoResult(jobId) {
     
     // Set up load completion handler
     videoElement.onloadeddata = function() {
+        // Show the video wrapper and video element
+        videoWrapper.classList.remove('hidden');
+        videoElement.classList.remove('hidden');
+        
+        if (preview) {
+            console.log('Preview loaded, waiting for the full video');
+            return;
+        }
+        
         // Hide loader and loader text
         const loader = document.querySelector('.loader');
         if (loader) {
@@ -353,10 +441,6 @@ function showVideoResult(jobId) {
             loadingText.classList.add('hidden');
         }
         
-        // Show the video wrapper and video element
-        videoWrapper.classList.remove('hidden');
-        videoElement.classList.remove('hidden');
-        
         // Enable download button
         downloadButton.classList.remove('hidden');
         downloadButton.addEventListener('click', function() {
@@ -367,7 +451,7 @@ function showVideoResult(jobId) {
     };
     
     // Set source with a timestamp to prevent caching issues
-    const videoUrl = `http://localhost:8000/api/v1/videos/${jobId}?t=${new Date().getTime()}`;
+    const videoUrl = `http://localhost:8000/api/v1/videos/${jobId}${preview ? '/preview' : ''}?t=${new Date().getTime()}`;
     console.log(`Loading video from URL: ${videoUrl}`);
     videoElement.src = videoUrl;
 }